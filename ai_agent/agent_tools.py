@@ -28,7 +28,7 @@ class UserProgressTool(BaseTool):
             
             return {
                 "success": True,
-                "progress_summary": progress.dict(),
+                "progress_summary": progress.model_dump(),
                 "detailed_statistics": detailed_stats
             }
         except Exception as e:
@@ -96,7 +96,7 @@ class QuestionGeneratorTool(BaseTool):
             
             return {
                 "success": True,
-                "questions": [q.dict() for q in questions],
+                "questions": [q.model_dump() for q in questions],
                 "count": len(questions),
                 "difficulty": difficulty
             }
@@ -4,10 +4,11 @@
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
-from utils.monitoring import monitoring
-from utils.health_check import health_checker
+from bot.utils.monitoring import monitoring
+from bot.utils.health_check import health_checker
 from services.progress_service import progress_service
 from core.database import db_service
+from services.user_analysis_service import user_analysis_service
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +83,7 @@ async def admin_reset_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         success = progress_service.reset_user_progress(user_id)
         
         if success:
+            user_analysis_service.invalidate_user(user_id)
             await update.message.reply_text(f"✅ Прогресс пользователя {user_id} сброшен")
         else:
             await update.message.reply_text(f"❌ Ошибка сброса прогресса пользователя {user_id}")
@@ -167,7 +169,7 @@ async def admin_clear_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        from utils.performance_optimizer import optimizer
+        from bot.utils.performance_optimizer import optimizer
         
         # Очищаем кэш
         cache_size_before = len(optimizer.cache)
@@ -4,20 +4,30 @@
 """
 import logging
 import asyncio
+from functools import lru_cache
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CallbackQueryHandler, MessageHandler, filters
 from telegram.error import BadRequest
 
 from core.database import db_service
-from config.bot_config import LEARNING_STRUCTURE, MESSAGES, ALIAS_TO_TOPIC
-from bot.keyboards.menu_keyboards import get_lessons_keyboard
+from config.bot_config import LEARNING_STRUCTURE, MESSAGES, ALIAS_TO_TOPIC, TOPIC_ALIASES
+from bot.keyboards.menu_keyboards import get_lessons_keyboard, BTN_MAIN_MENU, BTN_MENU, BTN_BACK
 from ai_agent.agent_graph import learning_agent
+from bot.utils.performance_optimizer import optimizer
+from services.user_analysis_service import user_analysis_service
+from bot.utils.helpers import parse_callback_data
+from config.performance_config import CACHE_SETTINGS
 
 logger = logging.getLogger(__name__)
 
+# Неизменные клавиатуры шага теста - создаются один раз
+_FINISH_QUIZ_KB = InlineKeyboardMarkup([[InlineKeyboardButton("🏁 Завершить тест", callback_data="action:finish_quiz")]])
+_NEXT_QUESTION_KB = InlineKeyboardMarkup([[InlineKeyboardButton("➡️ Следующий вопрос", callback_data="action:next_question")]])
+
+# Клавиатуры зависят только от (topic_id, lesson_id) и неизменяемы - переиспользуем готовые
+@lru_cache(maxsize=256)
 def get_lesson_start_keyboard(topic_id: str, lesson_id: int):
     """Клавиатура для начала урока"""
-    from config.bot_config import TOPIC_ALIASES
     topic_alias = TOPIC_ALIASES.get(topic_id)
     
     keyboard = [
@@ -26,11 +36,12 @@ def get_lesson_start_keyboard(topic_id: str, lesson_id: int):
         [InlineKeyboardButton("🤖 Задать вопрос AI", callback_data=f"action:ask_ai;tid:{topic_alias};lesson_id:{lesson_id}")],
         [
             InlineKeyboardButton("◀️ К урокам", callback_data=f"action:back_to_lessons;tid:{topic_alias}"),
-            InlineKeyboardButton("🏠 Меню", callback_data="action:back_to_menu")
+            BTN_MENU
         ]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@lru_cache(maxsize=256)
 def get_ai_help_keyboard(topic_id: str = None, lesson_id: int = None):
     """Клавиатура для помощи AI"""
     keyboard = [
@@ -40,26 +51,13 @@ def get_ai_help_keyboard(topic_id: str = None, lesson_id: int = None):
     ]
     
     if topic_id and lesson_id:
-        from config.bot_config import TOPIC_ALIASES
         topic_alias = TOPIC_ALIASES.get(topic_id)
         keyboard.append([InlineKeyboardButton("◀️ К уроку", callback_data=f"action:lesson;tid:{topic_alias};lesson_id:{lesson_id}")])
     else:
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="action:back_to_topics")])
+        keyboard.append([BTN_BACK])
     
     return InlineKeyboardMarkup(keyboard)
 
-def parse_callback_data(data: str) -> dict:
-    """Парсит callback data"""
-    result = {}
-    parts = data.split(';')
-    
-    for part in parts:
-        if ':' in part:
-            key, value = part.split(':', 1)
-            result[key] = value.strip()
-    
-    return result
-
 async def handle_lesson_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает все callback-запросы, связанные с уроками"""
     query = update.callback_query
@@ -226,14 +224,21 @@ async def handle_quick_ai_question(query, context, question_type: str):
         
         question = questions.get(question_type, "Помоги разобраться с банковскими рисками")
         
-        # Получаем ответ от AI-агента
-        try:
-            response = await asyncio.wait_for(
-                get_ai_response(query.from_user.id, question),
-                timeout=20.0
-            )
-        except asyncio.TimeoutError:
-            response = "⏰ Превышено время ожидания ответа. Попробуйте еще раз."
+        # Быстрые вопросы одинаковы для всех пользователей - ответ можно переиспользовать
+        cache_key = f"quick_ai_answer:{question_type}"
+        response = optimizer.get_from_cache(cache_key) if CACHE_SETTINGS["enable_ai_cache"] else None
+        
+        if response is None:
+            # Получаем ответ от AI-агента
+            try:
+                response = await asyncio.wait_for(
+                    get_ai_response(query.from_user.id, question),
+                    timeout=20.0
+                )
+                if CACHE_SETTINGS["enable_ai_cache"] and response not in _AI_FALLBACK_RESPONSES:
+                    optimizer.add_to_cache(cache_key, response, ttl=CACHE_SETTINGS["ai_cache_ttl"])
+            except asyncio.TimeoutError:
+                response = "⏰ Превышено время ожидания ответа. Попробуйте еще раз."
         
         # Обрезаем слишком длинный ответ
         if len(response) > 3500:
@@ -333,22 +338,28 @@ async def handle_user_ai_question(update: Update, context: ContextTypes.DEFAULT_
 async def get_ai_response(user_id: int, question: str) -> str:
     """Получение ответа от AI-агента"""
     try:
-        # Используем AI-агента для получения ответа
-        response = learning_agent.provide_learning_assistance(
+        # Вызов агента блокирующий - выполняем в потоке, чтобы таймаут вызывающего срабатывал
+        response = await asyncio.to_thread(
+            learning_agent.provide_learning_assistance,
             user_id=str(user_id),
-            question=question,
+            user_question=question,
             topic="банковские риски"
         )
         
         # Проверяем качество ответа
         if len(response.strip()) < 10:
-            return "Рекомендую изучить материалы урока для получения подробной информации по этому вопросу."
+            return _AI_SHORT_RESPONSE
         
         return response
         
     except Exception as e:
         logger.error(f"Ошибка получения AI-ответа: {e}")
-        return "Произошла ошибка при получении ответа. Попробуйте переформулировать вопрос."
+        return _AI_ERROR_RESPONSE
+
+# Ответы-заглушки get_ai_response не кэшируются
+_AI_SHORT_RESPONSE = "Рекомендую изучить материалы урока для получения подробной информации по этому вопросу."
+_AI_ERROR_RESPONSE = "Произошла ошибка при получении ответа. Попробуйте переформулировать вопрос."
+_AI_FALLBACK_RESPONSES = frozenset({_AI_SHORT_RESPONSE, _AI_ERROR_RESPONSE})
 
 async def handle_back_to_lessons(query, context, topic_id: str):
     """Возврат к списку уроков темы"""
@@ -472,12 +483,12 @@ async def handle_quiz_answer(query, context, data):
         
         if quiz_data['current_question'] >= len(quiz_data['questions']):
             result_text += "Нажмите 'Завершить тест' для просмотра результатов."
-            keyboard = [[InlineKeyboardButton("🏁 Завершить тест", callback_data="action:finish_quiz")]]
+            keyboard = _FINISH_QUIZ_KB
         else:
             result_text += "Нажмите 'Следующий вопрос' для продолжения."
-            keyboard = [[InlineKeyboardButton("➡️ Следующий вопрос", callback_data="action:next_question")]]
+            keyboard = _NEXT_QUESTION_KB
         
-        await query.edit_message_text(result_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+        await query.edit_message_text(result_text, reply_markup=keyboard, parse_mode='Markdown')
         
     except Exception as e:
         logger.error(f"Ошибка handle_quiz_answer: {e}")
@@ -536,6 +547,7 @@ async def show_quiz_results(query, context):
         
         # Сохраняем прогресс
         db_service.update_user_progress(user_id, user_progress)
+        user_analysis_service.invalidate_user(user_id)
         
         # Формируем сообщение с результатами
         if passed:
@@ -552,12 +564,11 @@ async def show_quiz_results(query, context):
 💡 Изучите материал и попробуйте снова!"""
         
         # Клавиатура для дальнейших действий
-        from config.bot_config import TOPIC_ALIASES
         topic_alias = TOPIC_ALIASES.get(topic_id)
         
         keyboard = [
             [InlineKeyboardButton("◀️ К урокам", callback_data=f"action:back_to_lessons;tid:{topic_alias}")],
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="action:back_to_menu")]
+            [BTN_MAIN_MENU]
         ]
         
         if not passed:
@@ -3,46 +3,55 @@
 Обработчик главного меню и навигации - ИСПРАВЛЕННАЯ ВЕРСИЯ
 """
 import logging
+import asyncio
+from typing import NamedTuple, Optional
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, MessageHandler, CallbackQueryHandler, filters
 from telegram.error import BadRequest
 
 from core.database import db_service
-from config.bot_config import LEARNING_STRUCTURE, MESSAGES, ALIAS_TO_TOPIC
-from bot.keyboards.menu_keyboards import get_topics_keyboard, get_lessons_keyboard
+from config.bot_config import LEARNING_STRUCTURE, MESSAGES, ALIAS_TO_TOPIC, TOPIC_ALIASES
+from bot.keyboards.menu_keyboards import (
+    get_topics_keyboard, get_lessons_keyboard,
+    get_main_menu_inline_keyboard, create_callback_data
+)
+from bot.utils.helpers import is_message_unchanged, edit_query_message, parse_callback_data
+from services.user_analysis_service import user_analysis_service
 
 logger = logging.getLogger(__name__)
 
-def parse_callback_data(data: str) -> dict:
-    """Парсит callback data"""
-    result = {}
-    parts = data.split(';')
-    
-    for part in parts:
-        if ':' in part:
-            key, value = part.split(':', 1)
-            result[key] = value.strip()
-    
-    return result
+# Статические клавиатуры одинаковы для всех пользователей - создаем один раз
+_MAIN_MENU_INLINE_KB = get_main_menu_inline_keyboard()
 
-async def handle_learning_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик кнопки 'Обучение'"""
-    if update.message.text != "📚 Обучение":
-        return
-    
-    await show_learning_topics(update.message.chat_id, context)
+async def handle_menu_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопок главного меню"""
+    handler = _MENU_DISPATCH.get(update.message.text)
+    if handler:
+        await handler(update, context)
 
-async def show_learning_topics(chat_id: int, context: ContextTypes.DEFAULT_TYPE, message_id: int = None):
+async def show_learning_topics(chat_id: int, context: ContextTypes.DEFAULT_TYPE, message_id: int = None,
+                               current_message=None):
     """Показывает меню выбора тем"""
     user_id = str(chat_id)
     user_progress = db_service.get_user_progress(user_id)
     text = "📚 Выберите тему для изучения:"
     reply_markup = get_topics_keyboard(user_progress)
     
-    logger.info(f"[show_learning_topics] Показываем темы для пользователя {user_id}")
+    if is_message_unchanged(current_message, text, reply_markup):
+        logger.debug("[show_learning_topics] Темы для пользователя %s не изменились", user_id)
+        return
+    
+    logger.debug("[show_learning_topics] Показываем темы для пользователя %s", user_id)
     
     try:
-        if message_id:
+        if message_id and current_message is not None and current_message.text == text:
+            # Текст тот же - меняется только клавиатура
+            await context.bot.edit_message_reply_markup(
+                chat_id=chat_id, 
+                message_id=message_id, 
+                reply_markup=reply_markup
+            )
+        elif message_id:
             await context.bot.edit_message_text(
                 chat_id=chat_id, 
                 message_id=message_id, 
@@ -64,49 +73,119 @@ async def show_learning_topics(chat_id: int, context: ContextTypes.DEFAULT_TYPE,
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Главный обработчик Callback-запросов"""
     query = update.callback_query
-    await query.answer()
     
-    logger.info(f"menu_handler: Получен callback: {query.data}")
+    logger.debug("menu_handler: Получен callback: %s", query.data)
 
-    data = parse_callback_data(query.data)
-    action = data.get("action")
-    user_id = str(query.from_user.id)
-    
-    topic_id = ALIAS_TO_TOPIC.get(data.get("tid"))
+    payload = _CALLBACK_PARSE_TABLE.get(query.data)
+    if payload is None:
+        # Неизвестная строка: устаревшая кнопка или подделка - отклоняем до работы с БД
+        payload = _parse_payload(query.data)
+        if not _is_valid_payload(payload):
+            logger.debug("menu_handler: Отклонен callback: %s", query.data)
+            await query.answer("⌛ Устаревшая кнопка")
+            return
+    action = payload.action
+
+    # Ответ на callback отправляется параллельно с основным запросом к Telegram;
+    # действия из _SELF_ANSWERING отвечают сами (например, с alert)
+    answer = None if action in _SELF_ANSWERING else asyncio.create_task(query.answer())
+
+    handler = _NO_TOPIC.get(action)
+    args = ()
+    if handler is None:
+        handler = _NEEDS_TOPIC[action]
+        args = (payload.topic_id,)
 
     try:
-        if action == "back_to_menu":
-            await query.message.delete()
-            from bot.keyboards.menu_keyboards import get_main_menu_keyboard
-            await context.bot.send_message(
-                chat_id=user_id, 
-                text="🏠 Главное меню", 
-                reply_markup=get_main_menu_keyboard()
-            )
-        elif action == "back_to_topics":
-            await show_learning_topics(user_id, context, query.message.message_id)
-        elif action == "topic":
-            await handle_topic_selection(query, context, topic_id)
-        elif action == "topic_locked":
-            await query.answer("🔒 Эта тема пока недоступна. Завершите предыдущие.", show_alert=True)
-        elif action == "confirm_reset":
-            await confirm_reset_progress(query, context)
-        elif action == "cancel_reset":
-            await query.edit_message_text(text="Сброс прогресса отменен.")
+        if action in _DEBOUNCED:
+            _schedule_render(update, context, action, handler, args)
+        else:
+            await _run_action(query, context, action, handler, args)
+    finally:
+        if answer:
+            await answer
+
+class CallbackPayload(NamedTuple):
+    """Разобранный callback меню"""
+    action: Optional[str]
+    topic_id: Optional[str] = None
+
+def _parse_payload(data: str) -> CallbackPayload:
+    """Разбор callback_data, которой нет в предвычисленной таблице"""
+    parsed = parse_callback_data(data)
+    action = parsed.get("action")
+    topic_id = ALIAS_TO_TOPIC.get(parsed.get("tid")) if action in _NEEDS_TOPIC else None
+    return CallbackPayload(action, topic_id)
+
+def _is_valid_payload(payload: CallbackPayload) -> bool:
+    """Известное действие и, если нужна тема, существующая тема"""
+    if payload.action not in _ALLOWED_ACTIONS:
+        return False
+    return payload.action not in _NEEDS_TOPIC or payload.topic_id in LEARNING_STRUCTURE
+
+async def _run_action(query, context, action: str, handler, args: tuple):
+    """Выполняет обработчик action с обработкой ошибок Telegram API"""
+    try:
+        await handler(query, context, *args)
     except BadRequest as e:
         if "Message is not modified" in str(e):
             logger.warning(f"Сообщение для action '{action}' не было изменено.")
-            await query.answer()
         else:
             logger.error(f"Ошибка Telegram API для action '{action}': {e}")
             await query.answer("Произошла ошибка.", show_alert=True)
     except Exception as e:
         logger.error(f"Критическая ошибка в handle_callback_query для action '{action}': {e}")
 
+def _schedule_render(update: Update, context, action: str, handler, args: tuple):
+    """Отрисовка без задержки; нажатия во время идущего редактирования того же сообщения схлопываются в последнее"""
+    query = update.callback_query
+    pending = context.chat_data.setdefault("_pending_edit", {})
+    message_id = query.message.message_id
+    
+    if message_id in pending:
+        # Сообщение уже редактируется: запоминаем только последнее нажатие
+        pending[message_id] = (query, action, handler, args)
+        return
+    
+    pending[message_id] = None
+    context.application.create_task(
+        _render_latest(context, pending, message_id, (query, action, handler, args)),
+        update=update
+    )
+
+async def _render_latest(context, pending: dict, message_id: int, tap: tuple):
+    """Отрисовывает нажатие, затем последнее из пришедших за время редактирования"""
+    try:
+        while tap is not None:
+            query, action, handler, args = tap
+            await _run_action(query, context, action, handler, args)
+            tap = pending[message_id]
+            pending[message_id] = None
+    finally:
+        pending.pop(message_id, None)
+
+async def back_to_menu(query, context: ContextTypes.DEFAULT_TYPE):
+    """Возврат в главное меню: одно редактирование вместо удаления и отправки"""
+    # Reply-клавиатура главного меню остается у пользователя с /start,
+    # к редактируемому сообщению можно прикрепить только inline-вариант
+    await query.edit_message_text("🏠 Главное меню", reply_markup=_MAIN_MENU_INLINE_KB)
+
+async def back_to_topics(query, context: ContextTypes.DEFAULT_TYPE):
+    """Возврат к выбору тем"""
+    await show_learning_topics(str(query.from_user.id), context, query.message.message_id, query.message)
+
+async def topic_locked(query, context: ContextTypes.DEFAULT_TYPE):
+    """Нажатие на заблокированную тему"""
+    await query.answer("🔒 Эта тема пока недоступна. Завершите предыдущие.", show_alert=True)
+
+async def cancel_reset_progress(query, context: ContextTypes.DEFAULT_TYPE):
+    """Отмена сброса прогресса"""
+    await query.edit_message_text(text="Сброс прогресса отменен.")
+
 async def handle_topic_selection(query, context, topic_id: str):
     """Обработка выбора темы -> показывает уроки"""
     try:
-        logger.info(f"[handle_topic_selection] Начало для topic_id: {topic_id}")
+        logger.debug("[handle_topic_selection] Начало для topic_id: %s", topic_id)
 
         if not topic_id or topic_id not in LEARNING_STRUCTURE:
             logger.warning(f"[handle_topic_selection] Неверный topic_id '{topic_id}'")
@@ -114,18 +193,21 @@ async def handle_topic_selection(query, context, topic_id: str):
 
         # Получаем свежие данные после возможного сброса
         user_progress = db_service.get_user_progress(str(query.from_user.id))
-        logger.info(f"[handle_topic_selection] Получен прогресс")
 
         topic_data = LEARNING_STRUCTURE[topic_id]
         text = f"*{topic_data['title']}*\n_{topic_data['description']}_\n\nВыберите урок:"
         
         # Передаем актуальные данные в get_lessons_keyboard
         reply_markup = get_lessons_keyboard(topic_id, user_progress)
-        logger.info(f"[handle_topic_selection] Клавиатура сформирована")
 
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
-        logger.info(f"[handle_topic_selection] Сообщение успешно отредактировано!")
+        await edit_query_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
+        logger.debug("[handle_topic_selection] Сообщение успешно отредактировано: %s", topic_id)
 
+    except BadRequest as e:
+        if "Message is not modified" in str(e):
+            logger.warning("[handle_topic_selection] Сообщение не было изменено")
+        else:
+            logger.error(f"[handle_topic_selection] Ошибка Telegram API: {e}")
     except Exception as e:
         logger.error(f"[handle_topic_selection] КРИТИЧЕСКАЯ ОШИБКА: {e}", exc_info=True)
 
@@ -144,6 +226,7 @@ async def confirm_reset_progress(query, context: ContextTypes.DEFAULT_TYPE):
         }
         
         db_service.update_user_progress(user_id, user_progress)
+        user_analysis_service.invalidate_user(user_id)
         
         logger.info(f"[confirm_reset_progress] Прогресс пользователя {user_id} успешно сброшен")
         
@@ -156,19 +239,58 @@ async def confirm_reset_progress(query, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"[confirm_reset_progress] Ошибка сброса прогресса для {user_id}: {e}")
         await query.edit_message_text(text="❌ Произошла ошибка при сбросе прогресса.")
 
+# Текст кнопки главного меню -> обработчик
+_MENU_DISPATCH = {
+    "📚 Обучение": lambda update, context: show_learning_topics(update.message.chat_id, context),
+}
+
+# action -> обработчик (query, context)
+_NO_TOPIC = {
+    "back_to_menu": back_to_menu,
+    "back_to_topics": back_to_topics,
+    "topic_locked": topic_locked,
+    "confirm_reset": confirm_reset_progress,
+    "cancel_reset": cancel_reset_progress,
+}
+
+# action -> обработчик (query, context, topic_id); алиас темы разбирается только для них
+_NEEDS_TOPIC = {
+    "topic": handle_topic_selection,
+}
+
+# Действия, которые сами отвечают на callback одним запросом
+_SELF_ANSWERING = frozenset({"topic_locked"})
+
+# Навигация, которую при частых нажатиях достаточно отрисовать один раз
+_DEBOUNCED = frozenset({"topic", "back_to_topics"})
+
+_ALLOWED_ACTIONS = frozenset(_NO_TOPIC) | frozenset(_NEEDS_TOPIC)
+
+# Все callback_data, которые выдают клавиатуры меню -> готовый разбор
+_CALLBACK_PARSE_TABLE = {
+    create_callback_data(action): CallbackPayload(action) for action in _NO_TOPIC
+}
+_CALLBACK_PARSE_TABLE.update(
+    (create_callback_data(action, tid=alias), CallbackPayload(action, topic_id))
+    for action in _NEEDS_TOPIC
+    for topic_id, alias in TOPIC_ALIASES.items()
+)
+_ACTION_PREFIX = "action:"
+
+def is_menu_callback(data) -> bool:
+    """Фильтр callback_data для меню: проверка action по множеству вместо regex"""
+    if not isinstance(data, str) or not data.startswith(_ACTION_PREFIX):
+        return False
+    return data.partition(";")[0][len(_ACTION_PREFIX):] in _ALLOWED_ACTIONS
+
 def register_menu_handlers(application):
     """Регистрация обработчиков меню"""
     
-    # Обработчик кнопки "Обучение"
+    # Кнопки главного меню: точное совпадение текста вместо регулярного выражения
     application.add_handler(MessageHandler(
-        filters.Regex(r"^📚 Обучение$"), 
-        handle_learning_button
+        filters.Text(list(_MENU_DISPATCH)), 
+        handle_menu_buttons
     ))
     
     # Callback-обработчики для меню
-    menu_actions = [
-        "back_to_menu", "back_to_topics", "topic", "topic_locked",
-        "confirm_reset", "cancel_reset"
-    ]
-    menu_callback_pattern = r"^action:(" + "|".join(menu_actions) + r").*"
-    application.add_handler(CallbackQueryHandler(handle_callback_query, pattern=menu_callback_pattern))
\ No newline at end of file
+    application.add_handler(CallbackQueryHandler(handle_callback_query, pattern=is_menu_callback))
@@ -2,164 +2,342 @@
 """
 Обработчик тестирования и оценки знаний 
 """
+import asyncio
+import html
 import logging
+import re
+from typing import NamedTuple, Optional, Tuple
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CallbackQueryHandler
+from telegram.error import BadRequest
 
 from core.database import db_service
 from config.bot_config import MESSAGES, ALIAS_TO_TOPIC
 from config.settings import settings
+from config.performance_config import LIMITS
 from bot.keyboards.menu_keyboards import get_quiz_keyboard, get_quiz_result_keyboard, get_lesson_start_keyboard
 from services.sticker_service import sticker_service
 from services.adaptive_content_service import adaptive_content_service
-from bot.utils.helpers import parse_callback_data
+from services.user_analysis_service import user_analysis_service
 
 logger = logging.getLogger(__name__)
 
+# Клавиатура после ответа одинакова для всех вопросов - создаем один раз
+_CONTINUE_KB = InlineKeyboardMarkup([[InlineKeyboardButton("➡️ Продолжить", callback_data="action:next_question")]])
+
+
+class QuizView(NamedTuple):
+    """Вопросы сессии, разложенные по параллельным кортежам"""
+    session_id: int
+    questions: Tuple[str, ...]          # Готовый HTML-текст сообщения с вопросом
+    options: Tuple[Tuple[str, ...], ...]
+    correct_answers: Tuple[int, ...]
+    correct_results: Tuple[str, ...]    # Готовый HTML-текст для верного ответа
+    wrong_results: Tuple[str, ...]      # Готовый HTML-текст для неверного ответа
+
+class QuizCallback(NamedTuple):
+    """Разобранный callback тестирования"""
+    action: str
+    topic_id: Optional[str]
+    lesson_id: Optional[int]
+    index: int
+
+    @classmethod
+    def from_match(cls, match) -> "QuizCallback":
+        """Один разбор: алиас темы -> topic_id, числовые поля -> int"""
+        action, tid, lesson_id, index = match.group("action", "tid", "lesson_id", "index")
+        return cls(
+            action,
+            ALIAS_TO_TOPIC.get(tid),
+            int(lesson_id) if lesson_id else None,
+            int(index) if index else -1,
+        )
+
+class QuizAnswer(NamedTuple):
+    """Ответ на вопрос до записи в БД"""
+    question_index: int
+    user_answer: int
+    is_correct: bool
+
+def _pending_answer_dicts(context: ContextTypes.DEFAULT_TYPE) -> list:
+    """Накопленные ответы в формате поля QuizSession.answers"""
+    return [answer._asdict() for answer in context.user_data.pop("quiz_pending_answers", ())]
+
+def _quiz_view(context: ContextTypes.DEFAULT_TYPE, session) -> QuizView:
+    """Представление вопросов сессии; строится один раз на сессию"""
+    view = context.user_data.get("_quiz_view")
+    if view is not None and view.session_id == session.id:
+        return view
+    
+    # Тексты AI экранируются один раз здесь, а не при каждом показе
+    questions = session.questions
+    explanations = [
+        f"💡 <b>Объяснение:</b>\n{html.escape(q['explanation'])}" if q.get('explanation') else "" for q in questions
+    ]
+    view = QuizView(
+        session_id=session.id,
+        questions=tuple(
+            f"❓ <b>Вопрос {i} из {len(questions)}</b>\n\n{html.escape(q['question'])}" for i, q in enumerate(questions, 1)
+        ),
+        options=tuple(tuple(q['options']) for q in questions),
+        correct_answers=tuple(q['correct_answer'] for q in questions),
+        correct_results=tuple(f"✅ <b>Правильно!</b>\n\n{explanation}" for explanation in explanations),
+        wrong_results=tuple(
+            f"❌ <b>Неправильно</b>\n\nПравильный ответ: <b>{html.escape(q['options'][q['correct_answer']])}</b>\n\n{explanation}"
+            for q, explanation in zip(questions, explanations)
+        ),
+    )
+    context.user_data["_quiz_view"] = view
+    return view
+
+async def _get_quiz_session(context: ContextTypes.DEFAULT_TYPE, user_id: str):
+    """Активная сессия тестирования: из context.user_data, в БД только при промахе"""
+    user_data = context.user_data
+    session = user_data.get("_quiz_session")
+    if session is not None and session.id == user_data.get("quiz_session_id") and not session.is_completed:
+        return session
+    
+    session = await db_service.run_async(db_service.get_active_quiz_session, user_id)
+    user_data["_quiz_session"] = session
+    return session
+
+async def _save_quiz_position(context: ContextTypes.DEFAULT_TYPE, session, question_index: int):
+    """Запись номера текущего вопроса; ответы копятся до завершения теста"""
+    if await db_service.run_async(db_service.update_quiz_session, session_id=session.id, current_question=question_index):
+        session.current_question = question_index
+    else:
+        context.user_data.pop("_quiz_session", None)
+
+# Все ключи context.user_data, которые заводит тестирование
+_QUIZ_CONTEXT_KEYS = ("quiz_session_id", "_quiz_session", "quiz_pending_answers", "_next_question", "_quiz_view")
+
+def _clear_quiz_context(context: ContextTypes.DEFAULT_TYPE):
+    """Очистка данных завершенного тестирования"""
+    user_data = context.user_data
+    for key in _QUIZ_CONTEXT_KEYS:
+        user_data.pop(key, None)
+
+def _question_payload(view: QuizView, question_index: int):
+    """Текст и клавиатура вопроса"""
+    return view.questions[question_index], get_quiz_keyboard(view.options[question_index])
+
+
+# Ограничение одновременных обращений к LLM, чтобы не исчерпать пул потоков
+_AI_GENERATION_SLOTS = asyncio.Semaphore(LIMITS["max_concurrent_ai_requests"])
+
+async def _generate_questions(user_id: str, topic_id: str, lesson_id: int):
+    """Генерация вопросов в отдельном потоке с ограничением параллельных AI-запросов"""
+    await _AI_GENERATION_SLOTS.acquire()
+    worker = asyncio.create_task(asyncio.to_thread(
+        adaptive_content_service.generate_adaptive_questions,
+        user_id=user_id, 
+        topic=topic_id, 
+        lesson_id=lesson_id
+    ))
+    # Поток нельзя прервать отменой: слот освобождается только когда он действительно завершится
+    worker.add_done_callback(_release_generation_slot)
+    return await asyncio.shield(worker)
+
+def _consume_task_result(task: asyncio.Task):
+    """Забирает результат брошенной задачи, чтобы ее исключение не осталось необработанным"""
+    if not task.cancelled():
+        task.exception()
+
+def _release_generation_slot(worker: asyncio.Task):
+    """Освобождение слота генерации по завершении потока"""
+    _AI_GENERATION_SLOTS.release()
+    _consume_task_result(worker)
+
+def _drop_task(task: asyncio.Task):
+    """Отмена задачи, результат которой больше не нужен (поток генерации дорабатывает со своим слотом)"""
+    task.cancel()
+    task.add_done_callback(_consume_task_result)
 
 async def start_quiz(query: Update, context: ContextTypes.DEFAULT_TYPE, topic_id: str, lesson_id: int):
     """Начало тестирования."""
     user_id = str(query.from_user.id)
+    questions_task = None
     try:
+        # Генерация идет в отдельном потоке, пока пользователю показывается сообщение ожидания
+        questions_task = asyncio.create_task(_generate_questions(user_id, topic_id, lesson_id))
         await query.edit_message_text("🧠 AI генерирует персональные вопросы...")
-        
-        # ИСПРАВЛЕНО: Убираем лишние параметры
-        questions_data = adaptive_content_service.generate_adaptive_questions(
-            user_id=user_id, 
-            topic=topic_id, 
-            lesson_id=lesson_id
-        )
+        questions_data = await questions_task
 
         if not questions_data:
             await query.edit_message_text("❌ Не удалось сгенерировать вопросы. Попробуйте позже.",
                                           reply_markup=get_lesson_start_keyboard(topic_id, lesson_id))
             return
 
-        session = db_service.create_quiz_session(user_id, topic_id, lesson_id, questions_data)
-        context.user_data["quiz_session_id"] = session.id
+        session = await db_service.run_async(db_service.create_quiz_session, user_id, topic_id, lesson_id, questions_data)
+        user_data = context.user_data
+        user_data.pop("_next_question", None)
+        user_data.update(quiz_session_id=session.id, _quiz_session=session, quiz_pending_answers=[])
         await show_question(query, context, 0)
+    except BadRequest as e:
+        # Ошибки Telegram API (устаревшее сообщение и т.п.) ожидаемы - без трассировки
+        logger.warning("Ошибка старта квиза (Telegram API): %s", e)
     except Exception as e:
-        logger.error(f"Ошибка старта квиза: {e}", exc_info=True)
+        logger.error("Ошибка старта квиза: %s", e, exc_info=True)
         await query.edit_message_text("Ошибка запуска тестирования.")
+    finally:
+        # Если ожидание генерации прервано ошибкой, задача не должна висеть с занятым слотом
+        if questions_task is not None:
+            _drop_task(questions_task)
 
 async def show_question(query, context: ContextTypes.DEFAULT_TYPE, question_index: int):
     """Показ вопроса пользователю."""
     session_id = context.user_data.get("quiz_session_id")
     if not session_id: return
-    session = db_service.get_active_quiz_session(str(query.from_user.id))
+    session = await _get_quiz_session(context, str(query.from_user.id))
     if not session or session.id != session_id: return
 
-    questions = session.questions
-    if question_index >= len(questions):
+    view = _quiz_view(context, session)
+    if question_index >= len(view.questions):
         await show_quiz_result(query, context)
         return
 
-    current_question = questions[question_index]
-    db_service.update_quiz_session(session_id=session_id, current_question=question_index)
-    
-    text = f"❓ *Вопрос {question_index + 1} из {len(questions)}*\n\n{current_question['question']}"
-    await query.edit_message_text(text, reply_markup=get_quiz_keyboard(current_question['options']), parse_mode='Markdown')
+    # Вопрос мог быть подготовлен заранее, пока пользователь читал объяснение
+    prepared = context.user_data.pop("_next_question", None)
+    if prepared and prepared[0] == question_index:
+        text, keyboard = prepared[1]
+    else:
+        text, keyboard = _question_payload(view, question_index)
+    await query.edit_message_text(text, reply_markup=keyboard, parse_mode='HTML')
 
 async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
 
-    logger.info(f"quiz_handler: Получен callback: {query.data}")
+    logger.info("quiz_handler: Получен callback: %s", query.data)
+
+    # Поля уже выделены группами скомпилированного шаблона при фильтрации
+    callback = QuizCallback.from_match(context.matches[0])
+    action = callback.action
 
-    data = parse_callback_data(query.data)
-    action = data.get("action")
+    # Telegram принимает только один ответ на callback: alert-ответ заменяет пустой
+    if action not in _SELF_ANSWERING:
+        await query.answer()
 
-    # Получаем полный topic_id из короткого алиаса `tid`
-    topic_id = ALIAS_TO_TOPIC.get(data.get("tid"))
+    handler = _QUIZ_DISPATCH.get(action)
+    if handler:
+        await handler(update, context, callback)
 
-    if action == "answer":
-        await handle_quiz_answer(update, context, data)
-    elif action == "next_question":
-        await handle_next_question(update, context)
-    elif action == "retry_lesson":
-        await start_quiz(query, context, topic_id, int(data.get("lesson_id")))
-    elif action == "study_material":
-        await query.answer("Эта функция в разработке.", show_alert=True)
+async def handle_retry_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE, callback: QuizCallback):
+    """Повторное прохождение теста по уроку."""
+    await start_quiz(update.callback_query, context, callback.topic_id, callback.lesson_id)
 
-async def handle_quiz_answer(update, context, data):
+async def handle_study_material(update: Update, context: ContextTypes.DEFAULT_TYPE, callback: QuizCallback):
+    """Изучение материала (в разработке)."""
+    await update.callback_query.answer("Эта функция в разработке.", show_alert=True)
+
+async def handle_quiz_answer(update, context, callback: QuizCallback):
     """Обработка ответа на вопрос."""
     query = update.callback_query
-    answer_index = int(data.get("index", -1))
-    session_id = context.user_data.get("quiz_session_id")
-    if session_id is None: return
+    answer_index = callback.index
+    user_data = context.user_data
+    # Некорректный callback отсекается до обращения к сессии и БД
+    if answer_index < 0 or user_data.get("quiz_session_id") is None: return
     
     user_id = str(query.from_user.id)
-    session = db_service.get_active_quiz_session(user_id)
+    session = await _get_quiz_session(context, user_id)
     if not session: return
 
+    view = _quiz_view(context, session)
     q_index = session.current_question
-    question = session.questions[q_index]
-    is_correct = (answer_index == question['correct_answer'])
+    if q_index >= len(view.questions) or answer_index >= len(view.options[q_index]): return
+
+    # Повторное нажатие (устаревшая кнопка) на уже отвеченный вопрос игнорируется
+    pending = user_data.setdefault("quiz_pending_answers", [])
+    if pending and pending[-1].question_index == q_index: return
 
-    answers = session.answers or []
-    answers.append({'question_index': q_index, 'user_answer': answer_index, 'is_correct': is_correct})
-    db_service.update_quiz_session(session_id=session_id, answers=answers)
+    is_correct = (answer_index == view.correct_answers[q_index])
 
-    await show_answer_result(query, context, is_correct, question)
+    # Ответы записываются в БД одним UPDATE при завершении теста
+    pending.append(QuizAnswer(q_index, answer_index, is_correct))
 
-async def show_answer_result(query, context, is_correct: bool, question_data: dict):
+    await show_answer_result(query, context, is_correct, view, q_index)
+
+    next_index = q_index + 1
+    if next_index < len(view.questions):
+        user_data["_next_question"] = (next_index, _question_payload(view, next_index))
+
+async def show_answer_result(query, context, is_correct: bool, view: QuizView, q_index: int):
     """Показ результата ответа на вопрос."""
-    if is_correct:
-        result_text = "✅ *Правильно!*\n\n"
-    else:
-        correct_option_text = question_data['options'][question_data['correct_answer']]
-        result_text = f"❌ *Неправильно*\n\nПравильный ответ: *{correct_option_text}*\n\n"
-    
-    if question_data.get('explanation'):
-        result_text += f"💡 *Объяснение:*\n{question_data['explanation']}"
-    
-    keyboard = [[InlineKeyboardButton("➡️ Продолжить", callback_data="action:next_question")]]
-    await query.edit_message_text(result_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+    result_text = view.correct_results[q_index] if is_correct else view.wrong_results[q_index]
+    await query.edit_message_text(result_text, reply_markup=_CONTINUE_KB, parse_mode='HTML')
 
-async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYPE, callback: QuizCallback = None):
     """Переход к следующему вопросу или результатам."""
     query = update.callback_query
-    session = db_service.get_active_quiz_session(str(query.from_user.id))
+    session = await _get_quiz_session(context, str(query.from_user.id))
     if not session: return
 
     next_q_index = session.current_question + 1
     if next_q_index >= len(session.questions):
         await show_quiz_result(query, context)
     else:
+        await _save_quiz_position(context, session, next_q_index)
         await show_question(query, context, next_q_index)
 
 async def show_quiz_result(query, context: ContextTypes.DEFAULT_TYPE):
     """Показ итогового результата тестирования."""
     user_id = str(query.from_user.id)
-    session = db_service.get_active_quiz_session(user_id)
+    session = await _get_quiz_session(context, user_id)
     if not session: return
 
+    # Накопленные ответы записываются вместе с итогом теста
+    pending = _pending_answer_dicts(context)
     correct_count = sum(1 for ans in session.answers if ans['is_correct'])
+    correct_count += sum(1 for ans in pending if ans['is_correct'])
     total = len(session.questions)
     score = (correct_count / total) * 100 if total > 0 else 0
     passed = score >= settings.min_score_to_pass
 
-    db_service.complete_quiz_session(session.id, score)
-    db_service.update_lesson_progress(user_id, session.topic_id, session.lesson_id, score, passed)
-
     if passed:
         result_text = MESSAGES["quiz_complete_success"].format(score=int(score), correct=correct_count, total=total)
     else:
         result_text = MESSAGES["quiz_complete_failure"].format(score=int(score), correct=correct_count, total=total, min_score=settings.min_score_to_pass)
     
+    # Запись итогов, стикер и итоговое сообщение независимы - выполняются параллельно
+    try:
+        await asyncio.gather(
+            db_service.run_async(
+                db_service.finalize_quiz, session.id, user_id, session.topic_id, session.lesson_id, score, passed, pending
+            ),
+            _send_result_sticker(context, query.message.chat_id, user_id, score),
+            query.edit_message_text(result_text, reply_markup=get_quiz_result_keyboard(session.topic_id, session.lesson_id, passed))
+        )
+    finally:
+        # Ответы уже забраны из контекста: даже при ошибке отправки тест нельзя пересчитать повторно
+        user_analysis_service.invalidate_user(user_id)
+        _clear_quiz_context(context)
+        
+_QUIZ_DISPATCH = {
+    "answer": handle_quiz_answer,
+    "next_question": handle_next_question,
+    "retry_lesson": handle_retry_lesson,
+    "study_material": handle_study_material,
+}
+
+# Действия, которые сами отвечают на callback (например, через show_alert)
+_SELF_ANSWERING = frozenset({"study_material"})
+
+# Один заранее скомпилированный шаблон на все действия тестирования: он же разбирает параметры
+_QUIZ_CALLBACK_PATTERN = re.compile(
+    r"^action:(?P<action>" + "|".join(_QUIZ_DISPATCH) + r")"
+    r"(?:;tid:(?P<tid>[^;]+))?(?:;lesson_id:(?P<lesson_id>\d+))?(?:;index:(?P<index>\d+))?$"
+)
+
+async def _send_result_sticker(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: str, score: float):
+    """Стикер по итогам теста; ошибка отправки не влияет на показ результата"""
     try:
         sticker = sticker_service.get_adaptive_sticker(user_id, {'lesson_completed': True, 'score': score})
-        if sticker: await context.bot.send_sticker(chat_id=query.message.chat_id, sticker=sticker)
+        # Тот же стикер, что и в прошлый раз, повторно не отправляем
+        if sticker and sticker != context.user_data.get("_last_sticker"):
+            await context.bot.send_sticker(chat_id=chat_id, sticker=sticker)
+            context.user_data["_last_sticker"] = sticker
     except Exception as e:
-        logger.warning(f"Ошибка отправки стикера: {e}")
+        logger.warning("Ошибка отправки стикера: %s", e)
 
-    await query.edit_message_text(result_text, reply_markup=get_quiz_result_keyboard(session.topic_id, session.lesson_id, passed))
-    context.user_data.pop("quiz_session_id", None)
-        
 def register_quiz_handlers(application):
     """Регистрация обработчиков тестирования."""
-    quiz_actions = [
-        "answer", "next_question", "retry_lesson", "study_material"
-    ]
-    quiz_callback_pattern = r"^action:(" + "|".join(quiz_actions) + r").*"
-    application.add_handler(CallbackQueryHandler(handle_quiz_callback, pattern=quiz_callback_pattern), group=3)
\ No newline at end of file
+    application.add_handler(CallbackQueryHandler(handle_quiz_callback, pattern=_QUIZ_CALLBACK_PATTERN), group=3)
\ No newline at end of file
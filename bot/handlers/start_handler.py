@@ -11,6 +11,9 @@ from bot.keyboards.menu_keyboards import get_main_menu_keyboard
 
 logger = logging.getLogger(__name__)
 
+# Главное меню статично: строим один раз при импорте
+_MAIN_MENU = get_main_menu_keyboard()
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user = update.effective_user
@@ -18,7 +21,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Создаем или получаем пользователя
-        user_progress = db_service.get_user_progress(user.id)
+        user_progress = await db_service.run_async(db_service.get_user_progress, user.id)
         if not user_progress:
             # Создаем нового пользователя
             initial_progress = {
@@ -31,7 +34,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "current_lesson": 1,
                 "topics_progress": {}
             }
-            db_service.update_user_progress(user.id, initial_progress)
+            await db_service.run_async(db_service.update_user_progress, user.id, initial_progress)
         
         logger.info(f"Пользователь {user.id} ({user.first_name}) запустил бота")
         
@@ -43,7 +46,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(
             chat_id=chat_id,
             text=welcome_text,
-            reply_markup=get_main_menu_keyboard(),
+            reply_markup=_MAIN_MENU,
             parse_mode='HTML'
         )
         
@@ -52,7 +55,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await context.bot.send_message(
             chat_id=chat_id,
             text="Произошла ошибка при запуске. Попробуйте еще раз.",
-            reply_markup=get_main_menu_keyboard()
+            reply_markup=_MAIN_MENU
         )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -62,7 +65,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(
         chat_id=chat_id,
         text=MESSAGES["help"],
-        reply_markup=get_main_menu_keyboard(),
+        reply_markup=_MAIN_MENU,
         parse_mode='HTML'
     )
 
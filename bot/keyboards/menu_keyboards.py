@@ -6,12 +6,26 @@
 3. Более гибкая логика доступности тем
 """
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
-from typing import List, Dict, Any
-from config.bot_config import LEARNING_STRUCTURE, TOPIC_ALIASES
+from typing import Dict, Any, Callable, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from config.bot_config import LEARNING_STRUCTURE, TOPIC_ALIASES, TOPIC_LESSON_COUNTS, TOPIC_ORDER
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Общий пустой словарь-умолчание для цепочек .get (только для чтения)
+_EMPTY: dict = {}
+
+# Максимальная длина текста варианта ответа на кнопке
+_OPTION_MAX_LEN = 60
+
+# LRU-кэш готовых клавиатур по компактной подписи прогресса
+_KEYBOARD_CACHE_SIZE = 256
+_keyboard_cache: "OrderedDict[tuple, InlineKeyboardMarkup]" = OrderedDict()
+# Карта доступности тем: предварительных условий нет, поэтому доступны все темы (O(1) проверка)
+_AVAILABLE_TOPICS = frozenset(TOPIC_ORDER)
+
 # --- Вспомогательная функция для создания callback_data ---
 def create_callback_data(action: str, **kwargs) -> str:
     """Создает строку callback_data в формате key:value;key2:value2;"""
@@ -21,69 +35,152 @@ def create_callback_data(action: str, **kwargs) -> str:
             parts.append(f"{key}:{value}")
     return ";".join(parts)
 
-# --- Основные клавиатуры ---
+# Специализированные сборщики для горячих клавиатур: форма строки известна заранее
+def _cb_topic(alias: str) -> str:
+    return f"action:topic;tid:{alias}"
 
-def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
-    """Главное меню бота"""
-    keyboard = [
+def _cb_lesson(alias: str, lesson_id: int) -> str:
+    return f"action:lesson;tid:{alias};lesson_id:{lesson_id}"
+
+def _cb_start_lesson(alias: str, lesson_id: int) -> str:
+    return f"action:start_lesson;tid:{alias};lesson_id:{lesson_id}"
+
+def _cb_show_material(alias: str, lesson_id: int) -> str:
+    return f"action:show_material;tid:{alias};lesson_id:{lesson_id}"
+
+def _cb_ask_ai(alias: str, lesson_id: int) -> str:
+    return f"action:ask_ai;tid:{alias};lesson_id:{lesson_id}"
+
+def _cb_back_to_lessons(alias: str) -> str:
+    return f"action:back_to_lessons;tid:{alias}"
+
+def _cb_retry(alias: str, lesson_id: int) -> str:
+    return f"action:retry_lesson;tid:{alias};lesson_id:{lesson_id}"
+
+def _cb_continue(alias: str) -> str:
+    return f"action:continue_learning;tid:{alias}"
+
+def _cb_answer(index: int) -> str:
+    return f"action:answer;index:{index}"
+
+# Статические кнопки, общие для нескольких клавиатур - создаются один раз
+BTN_MAIN_MENU = InlineKeyboardButton("🏠 Главное меню", callback_data="action:back_to_menu")
+BTN_MENU = InlineKeyboardButton("🏠 Меню", callback_data="action:back_to_menu")
+BTN_BACK_TO_TOPICS = InlineKeyboardButton("◀️ Назад к темам", callback_data="action:back_to_topics")
+BTN_BACK = InlineKeyboardButton("◀️ Назад", callback_data="action:back_to_topics")
+
+# Статические клавиатуры: разметка неизменяема, поэтому один экземпляр отдается всем вызовам
+_MAIN_MENU_KB = ReplyKeyboardMarkup(
+    [
         [KeyboardButton("📚 Обучение")],
         [KeyboardButton("📊 Прогресс"), KeyboardButton("ℹ️ Инструкция")],
         [KeyboardButton("🔄 Сброс прогресса")]
-    ]
-    return ReplyKeyboardMarkup(
-        keyboard, resize_keyboard=True, one_time_keyboard=False,
-        input_field_placeholder="Выберите действие..."
+    ],
+    resize_keyboard=True, one_time_keyboard=False,
+    input_field_placeholder="Выберите действие..."
+)
+_MAIN_MENU_INLINE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📚 Обучение", callback_data="action:back_to_topics")]
+])
+_PROGRESS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎯 Персональные рекомендации", callback_data="action:ai_recommendations")],
+    [BTN_MAIN_MENU]
+])
+_NO_TOPIC_KB = InlineKeyboardMarkup([[BTN_BACK_TO_TOPICS]])
+
+# Навигационные ряды: структура тем неизменна, поэтому кнопки "К урокам" строятся один раз на тему
+_BTN_BACK_TO_LESSONS = {
+    topic_id: InlineKeyboardButton("◀️ К урокам", callback_data=_cb_back_to_lessons(TOPIC_ALIASES.get(topic_id)))
+    for topic_id in LEARNING_STRUCTURE
+}
+_LESSON_NAV_ROW = {topic_id: (btn, BTN_MENU) for topic_id, btn in _BTN_BACK_TO_LESSONS.items()}
+_RESULT_NAV_ROW = {topic_id: (btn, BTN_MAIN_MENU) for topic_id, btn in _BTN_BACK_TO_LESSONS.items()}
+_BACK_TOPICS_MENU_ROW = (BTN_BACK_TO_TOPICS, BTN_MAIN_MENU)
+
+# Плоские таблицы тем и уроков: (id, заголовок, всего уроков, callback) и (id, подпись, callback)
+_TOPICS_ROWS = tuple(
+    (topic_id, topic_data["title"], TOPIC_LESSON_COUNTS[topic_id], _cb_topic(TOPIC_ALIASES.get(topic_id)))
+    for topic_id, topic_data in LEARNING_STRUCTURE.items()
+)
+_LESSONS_BY_TOPIC = {
+    topic_id: tuple(
+        (lesson["id"], f"{lesson['id']}. {lesson['title']}", _cb_lesson(TOPIC_ALIASES.get(topic_id), lesson["id"]))
+        for lesson in topic_data["lessons"]
     )
+    for topic_id, topic_data in LEARNING_STRUCTURE.items()
+}
+
+# Неизменная часть клавиатуры помощи AI (ряды-кортежи, собираются один раз)
+_AI_HELP_ROWS = (
+    (InlineKeyboardButton("💡 Объясни основные понятия", callback_data="action:quick_question;type:basics"),),
+    (InlineKeyboardButton("📖 Примеры из практики", callback_data="action:quick_question;type:examples"),),
+    (InlineKeyboardButton("✍️ Задать свой вопрос", callback_data="action:ask_custom_question"),),
+)
+
+# --- Основные клавиатуры ---
+
+def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
+    """Главное меню бота"""
+    return _MAIN_MENU_KB
+
+def get_main_menu_inline_keyboard() -> InlineKeyboardMarkup:
+    """Inline-вариант главного меню для редактирования сообщения из callback"""
+    return _MAIN_MENU_INLINE_KB
 
 def get_topics_keyboard(user_progress: Dict[str, Any] = None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора тем обучения (кэшируется по подписи прогресса)"""
+    if not user_progress:
+        return _TOPICS_KB_FRESH
+    key = ("topics", _topics_signature(user_progress))
+    return _cached_keyboard(key, lambda: _build_topics_keyboard(user_progress))
+
+def _build_topics_keyboard(user_progress: Dict[str, Any] = None) -> InlineKeyboardMarkup:
     """Клавиатура выбора тем обучения - ИСПРАВЛЕНО"""
     keyboard = []
     available_topics = _get_available_topics(user_progress)
+    topics_progress = user_progress.get("topics_progress", _EMPTY) if user_progress else _EMPTY
     
-    for topic_id, topic_data in LEARNING_STRUCTURE.items():
-        title = topic_data["title"]
-        if user_progress and topic_id in user_progress.get("topics_progress", {}):
-            topic_progress = user_progress["topics_progress"][topic_id]
-            completed = topic_progress.get("completed_lessons", 0)
-            total = len(topic_data["lessons"])
+    for topic_id, topic_title, total, topic_callback in _TOPICS_ROWS:
+        suffix = ""
+        if topic_id in topics_progress:
+            completed = topics_progress[topic_id].get("completed_lessons", 0)
             if completed == total:
-                title += " ✅"
+                suffix = " ✅"
             elif completed > 0:
-                title += f" ({completed}/{total})"
+                suffix = f" ({completed}/{total})"
 
         is_available = topic_id in available_topics
         
-        topic_alias = TOPIC_ALIASES.get(topic_id)
-        callback_data = create_callback_data("topic", tid=topic_alias) if is_available else "action:topic_locked"
+        callback_data = topic_callback if is_available else "action:topic_locked"
 
-        if not is_available:
-            title = f"🔒 {title}"
+        # Заголовок собираем одной f-строкой из вычисленных префикса и суффикса
+        lock = "" if is_available else "🔒 "
+        title = f"{lock}{topic_title}{suffix}"
         
-        keyboard.append([InlineKeyboardButton(title, callback_data=callback_data)])
+        keyboard.append((InlineKeyboardButton(title, callback_data=callback_data),))
     
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="action:back_to_menu")])
+    keyboard.append((BTN_MAIN_MENU,))
     return InlineKeyboardMarkup(keyboard)
 
+@lru_cache(maxsize=256)
 def get_lesson_start_keyboard(topic_id: str, lesson_id: int) -> InlineKeyboardMarkup:
-    """Клавиатура для начала урока"""
+    """Клавиатура для начала урока (чистая функция аргументов - кэшируется)"""
     topic_alias = TOPIC_ALIASES.get(topic_id)
-    keyboard = [
-        [InlineKeyboardButton("🚀 Начать тестирование", callback_data=create_callback_data("start_lesson", tid=topic_alias, lesson_id=lesson_id))],
-        [InlineKeyboardButton("📖 Изучить материал", callback_data=create_callback_data("show_material", tid=topic_alias, lesson_id=lesson_id))],
-        [InlineKeyboardButton("❓ Задать вопрос AI", callback_data=create_callback_data("ask_ai", tid=topic_alias, lesson_id=lesson_id))],
-        [
-            InlineKeyboardButton("◀️ К урокам", callback_data=create_callback_data("back_to_lessons", tid=topic_alias)),
-            InlineKeyboardButton("🏠 Меню", callback_data="action:back_to_menu")
-        ]
-    ]
+    keyboard = (
+        (InlineKeyboardButton("🚀 Начать тестирование", callback_data=_cb_start_lesson(topic_alias, lesson_id)),),
+        (InlineKeyboardButton("📖 Изучить материал", callback_data=_cb_show_material(topic_alias, lesson_id)),),
+        (InlineKeyboardButton("❓ Задать вопрос AI", callback_data=_cb_ask_ai(topic_alias, lesson_id)),),
+        _LESSON_NAV_ROW.get(topic_id) or _nav_row(topic_alias, BTN_MENU)
+    )
     return InlineKeyboardMarkup(keyboard)
 
-def get_quiz_keyboard(options: List[str]) -> InlineKeyboardMarkup:
-    """Клавиатура для вопросов тестирования"""
+@lru_cache(maxsize=1024)
+def get_quiz_keyboard(options: Tuple[str, ...]) -> InlineKeyboardMarkup:
+    """Клавиатура для вопросов тестирования (варианты передаются кортежем для кэша)"""
     keyboard = []
     for i, option in enumerate(options):
-        button_text = option if len(option) <= 60 else option[:57] + "..."
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=create_callback_data("answer", index=i))])
+        button_text = option if len(option) <= _OPTION_MAX_LEN else f"{option[:_OPTION_MAX_LEN - 1]}…"
+        keyboard.append((InlineKeyboardButton(button_text, callback_data=_cb_answer(i)),))
     return InlineKeyboardMarkup(keyboard)
 
 def get_quiz_result_keyboard(topic_id: str, lesson_id: int, passed: bool) -> InlineKeyboardMarkup:
@@ -91,37 +188,26 @@ def get_quiz_result_keyboard(topic_id: str, lesson_id: int, passed: bool) -> Inl
     topic_alias = TOPIC_ALIASES.get(topic_id)
     keyboard = []
     if passed:
-        keyboard.append([InlineKeyboardButton("🎉 Продолжить обучение", callback_data=create_callback_data("continue_learning", tid=topic_alias))])
+        keyboard.append((InlineKeyboardButton("🎉 Продолжить обучение", callback_data=_cb_continue(topic_alias)),))
     else:
-        keyboard.append([InlineKeyboardButton("🔄 Повторить урок", callback_data=create_callback_data("retry_lesson", tid=topic_alias, lesson_id=lesson_id))])
-        keyboard.append([InlineKeyboardButton("📚 Изучить материал", callback_data=create_callback_data("show_material", tid=topic_alias, lesson_id=lesson_id))])
+        keyboard.append((InlineKeyboardButton("🔄 Повторить урок", callback_data=_cb_retry(topic_alias, lesson_id)),))
+        keyboard.append((InlineKeyboardButton("📚 Изучить материал", callback_data=_cb_show_material(topic_alias, lesson_id)),))
     
-    keyboard.append([
-        InlineKeyboardButton("◀️ К урокам", callback_data=create_callback_data("back_to_lessons", tid=topic_alias)),
-        InlineKeyboardButton("🏠 Главное меню", callback_data="action:back_to_menu")
-    ])
+    keyboard.append(_RESULT_NAV_ROW.get(topic_id) or _nav_row(topic_alias, BTN_MAIN_MENU))
     return InlineKeyboardMarkup(keyboard)
 
 def get_progress_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для страницы прогресса"""
-    keyboard = [
-        [InlineKeyboardButton("🎯 Персональные рекомендации", callback_data="action:ai_recommendations")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="action:back_to_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return _PROGRESS_KB
 
 def get_ai_help_keyboard(topic_id: str = None, lesson_id: int = None) -> InlineKeyboardMarkup:
     """Клавиатура для помощи AI"""
-    keyboard = [
-        [InlineKeyboardButton("💡 Объясни основные понятия", callback_data="action:quick_question;type:basics")],
-        [InlineKeyboardButton("📖 Примеры из практики", callback_data="action:quick_question;type:examples")],
-        [InlineKeyboardButton("✍️ Задать свой вопрос", callback_data="action:ask_custom_question")],
-    ]
+    keyboard = list(_AI_HELP_ROWS)
     if topic_id and lesson_id:
         topic_alias = TOPIC_ALIASES.get(topic_id)
-        keyboard.append([InlineKeyboardButton("◀️ К уроку", callback_data=create_callback_data("lesson", tid=topic_alias, lesson_id=lesson_id))])
+        keyboard.append((InlineKeyboardButton("◀️ К уроку", callback_data=_cb_lesson(topic_alias, lesson_id)),))
     else:
-        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="action:back_to_topics")])
+        keyboard.append((BTN_BACK,))
     return InlineKeyboardMarkup(keyboard)
 
 def get_confirmation_keyboard(action_to_confirm: str) -> InlineKeyboardMarkup:
@@ -133,108 +219,97 @@ def get_confirmation_keyboard(action_to_confirm: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 def get_lessons_keyboard(topic_id: str, user_progress: Dict[str, Any] = None) -> InlineKeyboardMarkup:
-    """Клавиатура выбора уроков в теме - ИСПРАВЛЕНО"""
+    """Клавиатура выбора уроков в теме (кэшируется по подписи прогресса)"""
+    key = ("lessons", topic_id, _lessons_signature(topic_id, user_progress))
+    return _cached_keyboard(key, lambda: _build_lessons_keyboard(topic_id, user_progress))
+
+def _build_lessons_keyboard(topic_id: str, user_progress: Dict[str, Any] = None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора уроков в теме - доступность и статусы за один проход"""
     keyboard = []
-    topic_data = LEARNING_STRUCTURE.get(topic_id)
-    if not topic_data:
-        return InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Назад к темам", callback_data="action:back_to_topics")]])
+    lessons = _LESSONS_BY_TOPIC.get(topic_id)
+    if not lessons:
+        return _NO_TOPIC_KB
 
-    available_lessons = _get_available_lessons(topic_id, user_progress)
+    logger.debug("[get_lessons_keyboard] topic_id: %s", topic_id)
     
-    logger.info(f"[get_lessons_keyboard] topic_id: {topic_id}")
-    logger.info(f"[get_lessons_keyboard] available_lessons: {available_lessons}")
-    
-    topic_alias = TOPIC_ALIASES.get(topic_id)
+    # Прогресс уроков темы разрешаем один раз, дальше - O(1) поиск по id урока
+    lessons_progress = _get_lessons_progress(topic_id, user_progress)
+    # Первый урок доступен всегда, каждый следующий - после завершения предыдущего
+    prev_completed = True
 
-    for lesson in topic_data["lessons"]:
-        lesson_id = lesson["id"]
-        title = f"{lesson_id}. {lesson['title']}"
-        
-        is_available = lesson_id in available_lessons
-        
-        if user_progress:
-            lesson_status = _get_lesson_status(topic_id, lesson_id, user_progress)
-            if lesson_status["is_completed"]:
-                title = f"✅ {title}"
-            elif lesson_status["attempts"] > 0:
-                title = f"🔄 {title}"
+    for lesson_id, label, lesson_callback in lessons:
+        # ВАЖНО: Используем lesson_id как число, НЕ как строку
+        lesson_data = lessons_progress.get(lesson_id) or _EMPTY
+        is_available = prev_completed
+        prev_completed = bool(lesson_data.get("is_completed"))
         
-        callback_data = create_callback_data("lesson", tid=topic_alias, lesson_id=lesson_id) if is_available else "action:lesson_locked"
-        if not is_available:
-            title = f"🔒 {title}"
+        callback_data = lesson_callback if is_available else "action:lesson_locked"
         
-        logger.info(f"[get_lessons_keyboard] Урок {lesson_id}: доступен={is_available}, callback={callback_data}")
+        # Заголовок собираем одной f-строкой из вычисленных префиксов
+        lock = "" if is_available else "🔒 "
+        status = "✅ " if prev_completed else ("🔄 " if lesson_data.get("attempts", 0) > 0 else "")
+        title = f"{lock}{status}{label}"
         
-        keyboard.append([InlineKeyboardButton(title, callback_data=callback_data)])
+        keyboard.append((InlineKeyboardButton(title, callback_data=callback_data),))
 
-    keyboard.append([
-        InlineKeyboardButton("◀️ Назад к темам", callback_data="action:back_to_topics"),
-        InlineKeyboardButton("🏠 Главное меню", callback_data="action:back_to_menu")
-    ])
+    keyboard.append(_BACK_TOPICS_MENU_ROW)
     return InlineKeyboardMarkup(keyboard)
 
 # --- Вспомогательные функции ---
 
-def _get_available_topics(user_progress: Dict[str, Any] = None) -> List[str]:
+def _nav_row(topic_alias: str, menu_button: InlineKeyboardButton) -> tuple:
+    """Ряд "К урокам" + меню для темы вне LEARNING_STRUCTURE"""
+    return (InlineKeyboardButton("◀️ К урокам", callback_data=_cb_back_to_lessons(topic_alias)), menu_button)
+
+def _cached_keyboard(key: tuple, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+    """Возвращает клавиатуру из LRU-кэша или строит и запоминает новую"""
+    keyboard = _keyboard_cache.get(key)
+    if keyboard is not None:
+        _keyboard_cache.move_to_end(key)
+        return keyboard
+    
+    keyboard = build()
+    _keyboard_cache[key] = keyboard
+    if len(_keyboard_cache) > _KEYBOARD_CACHE_SIZE:
+        _keyboard_cache.popitem(last=False)
+    return keyboard
+
+def _topics_signature(user_progress: Dict[str, Any] = None) -> tuple:
+    """Подпись прогресса для клавиатуры тем: число завершенных уроков по темам"""
+    if not user_progress:
+        return ()
+    topics_progress = user_progress.get("topics_progress", _EMPTY)
+    return tuple(
+        (topic_id, topics_progress[topic_id].get("completed_lessons", 0))
+        for topic_id in LEARNING_STRUCTURE if topic_id in topics_progress
+    )
+
+def _lessons_signature(topic_id: str, user_progress: Dict[str, Any] = None) -> tuple:
+    """Подпись прогресса для клавиатуры уроков: (завершен, были попытки) по урокам"""
+    lessons = _LESSONS_BY_TOPIC.get(topic_id)
+    if not user_progress or not lessons:
+        return ()
+    lessons_data = user_progress.get("topics_progress", _EMPTY).get(topic_id, _EMPTY).get("lessons", _EMPTY)
+    signature = []
+    for lesson_id, _, _ in lessons:
+        lesson_data = lessons_data.get(lesson_id) or _EMPTY
+        signature.append((bool(lesson_data.get("is_completed")), lesson_data.get("attempts", 0) > 0))
+    return tuple(signature)
+
+def _get_available_topics(user_progress: Dict[str, Any] = None) -> frozenset:
     """ИСПРАВЛЕНО: Все темы доступны сразу, блокируются только уроки внутри них"""
-    # ГЛАВНОЕ ИЗМЕНЕНИЕ: возвращаем ВСЕ темы вместо только первой
-    available_topics = list(LEARNING_STRUCTURE.keys())
+    # ГЛАВНОЕ ИЗМЕНЕНИЕ: возвращаем ВСЕ темы вместо только первой (готовое множество)
+    available_topics = _AVAILABLE_TOPICS
     
-    logger.info(f"[_get_available_topics] Все темы доступны: {available_topics}")
+    logger.debug("[_get_available_topics] Все темы доступны: %s", available_topics)
     return available_topics
 
-def _get_available_lessons(topic_id: str, user_progress: Dict[str, Any] = None) -> List[int]:
-    """ИСПРАВЛЕНО: Правильная работа с ключами уроков и первый урок в каждой теме"""
-    logger.info(f"[_get_available_lessons] Начало для темы {topic_id}")
-    
-    # ИЗМЕНЕНИЕ: Первый урок ВСЕГДА доступен в ЛЮБОЙ теме
-    available = [1]
-    
-    if not user_progress: 
-        logger.info(f"[_get_available_lessons] Нет прогресса - доступен урок 1 в теме {topic_id}")
-        return available
-    
-    topic_progress = user_progress.get("topics_progress", {}).get(topic_id)
-    if not topic_progress: 
-        logger.info(f"[_get_available_lessons] Нет прогресса по теме {topic_id} - доступен урок 1")
-        return available
-    
-    lessons_data = topic_progress.get("lessons", {})
-    total_lessons = len(LEARNING_STRUCTURE[topic_id]["lessons"])
-    
-    # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: используем lesson_id как int, НЕ как строку
-    for lesson_id in range(1, total_lessons + 1):
-        lesson_data = lessons_data.get(lesson_id)  # Убрали str()!
-        
-        if lesson_data and lesson_data.get("is_completed"):
-            next_lesson = lesson_id + 1
-            if next_lesson <= total_lessons and next_lesson not in available:
-                available.append(next_lesson)
-                logger.info(f"[_get_available_lessons] ✅ Урок {next_lesson} разблокирован")
-    
-    logger.info(f"[_get_available_lessons] ✅ Доступные уроки в {topic_id}: {available}")
-    return available
+def _get_lessons_progress(topic_id: str, user_progress: Dict[str, Any] = None) -> Dict[int, Any]:
+    """Словарь прогресса уроков темы (пустой, если прогресса нет)"""
+    if not user_progress:
+        return _EMPTY
+    topic_progress = (user_progress.get("topics_progress") or _EMPTY).get(topic_id) or _EMPTY
+    return topic_progress.get("lessons") or _EMPTY
 
-def _get_lesson_status(topic_id: str, lesson_id: int, user_progress: Dict[str, Any]) -> Dict[str, Any]:
-    """Получение статуса конкретного урока"""
-    default_status = {"is_completed": False, "attempts": 0, "best_score": 0}
-    
-    try:
-        topics_progress = user_progress.get("topics_progress", {})
-        topic_progress = topics_progress.get(topic_id, {})
-        lessons_progress = topic_progress.get("lessons", {})
-        # ВАЖНО: Используем lesson_id как число, НЕ как строку
-        lesson_data = lessons_progress.get(lesson_id)
-        
-        if lesson_data:
-            return {
-                "is_completed": lesson_data.get("is_completed", False),
-                "attempts": lesson_data.get("attempts", 0),
-                "best_score": lesson_data.get("best_score", 0)
-            }
-        else:
-            return default_status
-            
-    except (KeyError, AttributeError) as e:
-        logger.warning(f"Ошибка получения статуса урока {lesson_id} темы {topic_id}: {e}")
-        return default_status
\ No newline at end of file
+# Клавиатура тем для пользователя без прогресса: строится один раз при импорте и не вытесняется из LRU
+_TOPICS_KB_FRESH = _build_topics_keyboard()
\ No newline at end of file
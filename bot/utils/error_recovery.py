@@ -3,6 +3,8 @@
 """
 import logging
 import asyncio
+import random
+import time
 from typing import Callable, Any
 from functools import wraps
 
@@ -12,8 +14,12 @@ class ErrorRecovery:
     """Класс для восстановления после ошибок"""
     
     @staticmethod
-    def with_retry(max_retries: int = 2, delay: float = 1.0):
-        """Декоратор для повторных попыток"""
+    def with_retry(max_retries: int = 2, delay: float = 1.0, max_delay: float = 30.0):
+        """Декоратор для повторных попыток с экспоненциальной задержкой и джиттером"""
+        def backoff(attempt: int) -> float:
+            # Случайный множитель разводит повторы параллельных вызовов после общего сбоя
+            return min(delay * (2 ** attempt) * random.uniform(0.5, 1.5), max_delay)
+        
         def decorator(func: Callable):
             @wraps(func)
             async def async_wrapper(*args, **kwargs):
@@ -25,8 +31,9 @@ class ErrorRecovery:
                     except Exception as e:
                         last_exception = e
                         if attempt < max_retries:
-                            logger.warning(f"Попытка {attempt + 1} неудачна, повторяю через {delay}с: {e}")
-                            await asyncio.sleep(delay)
+                            wait = backoff(attempt)
+                            logger.warning("Попытка %d неудачна, повторяю через %.1fс: %s", attempt + 1, wait, e)
+                            await asyncio.sleep(wait)
                         else:
                             logger.error(f"Все {max_retries + 1} попыток неудачны: {e}")
                 
@@ -42,9 +49,9 @@ class ErrorRecovery:
                     except Exception as e:
                         last_exception = e
                         if attempt < max_retries:
-                            logger.warning(f"Попытка {attempt + 1} неудачна, повторяю через {delay}с: {e}")
-                            import time
-                            time.sleep(delay)
+                            wait = backoff(attempt)
+                            logger.warning("Попытка %d неудачна, повторяю через %.1fс: %s", attempt + 1, wait, e)
+                            time.sleep(wait)
                         else:
                             logger.error(f"Все {max_retries + 1} попыток неудачны: {e}")
                 
@@ -1,7 +1,11 @@
 """
 Проверка здоровья системы
 """
+import asyncio
+import copy
 import logging
+import time
+from functools import lru_cache
 from typing import Dict, Any
 from datetime import datetime
 from ai_agent.agent_nodes import AgentNodes
@@ -21,14 +25,18 @@ class HealthChecker:
             "components": {}
         }
         
-        # Проверка базы данных
-        results["components"]["database"] = HealthChecker._check_database()
-        
-        # Проверка AI-агента
-        results["components"]["ai_agent"] = await HealthChecker._check_ai_agent()
-        
-        # Проверка конфигурации
-        results["components"]["config"] = HealthChecker._check_config()
+        # БД, AI-агент и конфигурация проверяются параллельно: общее время - по самой долгой проверке
+        names = ("database", "ai_agent", "config")
+        checks = await asyncio.gather(
+            asyncio.to_thread(HealthChecker._check_database),
+            HealthChecker._check_ai_agent(),
+            asyncio.to_thread(HealthChecker._check_config),
+            return_exceptions=True
+        )
+        for name, status in zip(names, checks):
+            if isinstance(status, Exception):
+                status = {"healthy": False, "message": f"Ошибка проверки: {status}", "error": str(status)}
+            results["components"][name] = status
         
         # Определение общего статуса
         failed_components = [
@@ -76,9 +84,9 @@ class HealthChecker:
                 "topic": "тест"
             }
             
-            start_time = time.time()
-            result = AgentNodes.provide_assistance_node(test_state)
-            response_time = time.time() - start_time
+            start_time = time.perf_counter()
+            result = await asyncio.to_thread(AgentNodes.provide_assistance_node, test_state)
+            response_time = time.perf_counter() - start_time
             
             if result.get("assistance_response"):
                 return {
@@ -101,7 +109,13 @@ class HealthChecker:
     
     @staticmethod
     def _check_config() -> Dict[str, Any]:
-        """Проверка конфигурации"""
+        """Проверка конфигурации (копия кэшированного результата - вызывающий может его менять)"""
+        return copy.deepcopy(HealthChecker._config_report())
+    
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _config_report() -> Dict[str, Any]:
+        """Проверка констант модуля конфигурации - результат кэшируется"""
         try:
             from config.bot_config import LEARNING_STRUCTURE, TOPIC_ALIASES
             
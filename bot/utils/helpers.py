@@ -2,9 +2,13 @@
 Вспомогательные утилиты для бота
 """
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Пара key:value внутри callback_data; значение - все до следующего ';' (может содержать ':')
+_PAIR_RE = re.compile(r"([^:;]+):([^;]*)")
+
 
 def parse_callback_data(data: str) -> dict:
     """
@@ -20,15 +24,8 @@ def parse_callback_data(data: str) -> dict:
         return {}
     
     try:
-        result = {}
-        parts = data.split(';')
-        
-        for part in parts:
-            if ':' in part:
-                key, value = part.split(':', 1)  # Разделяем только по первому ':'
-                result[key] = value.strip()
-        
-        logger.debug(f"Parsed callback_data: {data} -> {result}")
+        result = dict(_PAIR_RE.findall(data))
+        logger.debug("Parsed callback_data: %s -> %s", data, result)
         return result
         
     except Exception as e:
@@ -47,8 +44,53 @@ def validate_callback_data(data: dict, required_fields: list) -> bool:
     Returns:
         bool: True если все поля присутствуют
     """
-    for field in required_fields:
-        if field not in data:
-            logger.warning(f"Отсутствует обязательное поле '{field}' в callback_data")
-            return False
-    return True
\ No newline at end of file
+    missing = set(required_fields).difference(data)
+    if missing:
+        logger.warning("Отсутствуют обязательные поля %s в callback_data", sorted(missing))
+        return False
+    return True
+
+def is_message_unchanged(message, text: str, reply_markup=None, parse_mode: str = None) -> bool:
+    """
+    Проверяет, совпадает ли новое содержимое с уже показанным сообщением.
+    
+    Telegram отвечает ошибкой "Message is not modified" на идентичное редактирование,
+    поэтому такой запрос можно не отправлять вовсе.
+    
+    Args:
+        message: Текущее сообщение (например, query.message)
+        text: Новый текст
+        reply_markup: Новая клавиатура
+        parse_mode: Режим разметки нового текста
+    
+    Returns:
+        bool: True если редактирование ничего не изменит
+    """
+    if message is None or message.reply_markup != reply_markup:
+        return False
+    
+    return _current_text(message, parse_mode) == text
+
+def _current_text(message, parse_mode: str = None) -> str:
+    """Текст сообщения в том же виде, в каком передается новый текст (None, если его не восстановить)"""
+    if parse_mode != 'Markdown':
+        return message.text
+    try:
+        return message.text_markdown
+    except ValueError:
+        # Подчеркивание, зачеркивание, спойлер и т.п. не выражаются в Markdown V1 - сравнение невозможно
+        return None
+
+async def edit_query_message(query, text: str, reply_markup=None, parse_mode: str = None):
+    """
+    Редактирует сообщение callback-запроса минимальным вызовом API.
+    
+    Если текст не изменился, отправляется только editMessageReplyMarkup,
+    а при полном совпадении запрос не отправляется вовсе.
+    """
+    message = query.message
+    if message is not None and _current_text(message, parse_mode) == text:
+        if message.reply_markup != reply_markup:
+            await query.edit_message_reply_markup(reply_markup=reply_markup)
+        return
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
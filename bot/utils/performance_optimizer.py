@@ -2,8 +2,9 @@
 Оптимизатор производительности
 """
 import asyncio
+import heapq
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from functools import lru_cache
 from config.performance_config import TIMEOUTS, LIMITS, CACHE_SETTINGS
 
@@ -13,7 +14,9 @@ class PerformanceOptimizer:
     def __init__(self):
         self.operation_queue = asyncio.Queue()
         self.active_operations = {}
-        self.cache = {}
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        # Куча (момент истечения, ключ): TTL у записей разные, поэтому порядок истечения ведем отдельно
+        self._expiry_heap: List[Tuple[float, str]] = []
     
     @staticmethod
     @lru_cache(maxsize=100)
@@ -69,10 +72,14 @@ class PerformanceOptimizer:
     
     def add_to_cache(self, key: str, value: Any, ttl: int = 300):
         """Добавление в кэш с TTL"""
+        now = time.monotonic()
+        expires_at = now + ttl
         self.cache[key] = {
             "value": value,
-            "expires_at": time.time() + ttl
+            "expires_at": expires_at
         }
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        self._evict_expired(now)
     
     def get_from_cache(self, key: str) -> Optional[Any]:
         """Получение из кэша"""
@@ -80,15 +87,27 @@ class PerformanceOptimizer:
             return None
         
         cache_entry = self.cache[key]
-        if time.time() > cache_entry["expires_at"]:
+        if time.monotonic() > cache_entry["expires_at"]:
             del self.cache[key]
             return None
         
         return cache_entry["value"]
     
+    
+    def _evict_expired(self, now: float):
+        """Удаление истекших записей по куче (O(log n) на запись)"""
+        heap = self._expiry_heap
+        cache = self.cache
+        while heap and heap[0][0] < now:
+            expires_at, key = heapq.heappop(heap)
+            entry = cache.get(key)
+            # Запись могла быть перезаписана с новым сроком или уже удалена
+            if entry is not None and entry["expires_at"] == expires_at:
+                del cache[key]
+    
     def clear_expired_cache(self):
         """Очистка устаревшего кэша"""
-        current_time = time.time()
+        current_time = time.monotonic()
         expired_keys = [
             key for key, entry in self.cache.items() 
             if current_time > entry["expires_at"]
@@ -98,4 +117,4 @@ class PerformanceOptimizer:
             del self.cache[key]
 
 # Глобальный оптимизатор
-optimizer = PerformanceOptimizer()
\ No newline at end of file
+optimizer = PerformanceOptimizer()
@@ -163,6 +163,12 @@ TOPIC_ALIASES = {
 # Обратный маппинг
 ALIAS_TO_TOPIC = {v: k for k, v in TOPIC_ALIASES.items()}
 
+# Количество уроков в каждой теме (структура неизменна)
+TOPIC_LESSON_COUNTS = {topic_id: len(topic["lessons"]) for topic_id, topic in LEARNING_STRUCTURE.items()}
+
+# Порядок тем обучения
+TOPIC_ORDER = tuple(LEARNING_STRUCTURE)
+
 # Настройки меню
 MENU_BUTTONS = {
     "📚 Обучение": "обучение",
@@ -23,7 +23,9 @@ CACHE_SETTINGS = {
     "enable_lesson_cache": True,
     "lesson_cache_ttl": 3600,  # 1 час
     "enable_ai_cache": False,  # Отключено для уникальности ответов
-    "user_progress_cache_ttl": 300  # 5 минут
+    "ai_cache_ttl": 3600,  # 1 час, если кэш AI-ответов включен
+    "user_progress_cache_ttl": 300,  # 5 минут
+    "user_analysis_cache_size": 1000  # Пользователей в кэше анализа
 }
 
 # Приоритеты операций
@@ -32,4 +34,20 @@ OPERATION_PRIORITIES = {
     "ai_question": "medium", 
     "progress_update": "high",
     "statistics": "low"
-}
\ No newline at end of file
+}
+
+# HTTP-клиент Telegram
+TELEGRAM_HTTP = {
+    "connection_pool_size": 64,  # Постоянные соединения для всех вызовов context.bot.*
+    "pool_timeout": 5.0,
+    "http_version": "2"          # Мультиплексирование запросов в одном TLS-соединении
+}
+
+# Ограничение запросов к Telegram
+TELEGRAM_RATE_LIMITS = {
+    "overall_max_rate": 28,      # Запросов в секунду на весь бот (лимит Telegram - 30)
+    "overall_time_period": 1,
+    "group_max_rate": 20,        # Сообщений в минуту на групповой чат
+    "group_time_period": 60,
+    "max_retries": 2             # Повторы после RetryAfter от Telegram
+}
@@ -2,6 +2,8 @@
 Сервис для работы с базой данных
 """
 import logging
+import asyncio
+import json
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from contextlib import contextmanager
@@ -14,19 +16,23 @@ from core.models import UserData, QuizResult, UserProgressResponse
 
 logger = logging.getLogger(__name__)
 
+DB_POOL_SIZE = 10
+DB_MAX_OVERFLOW = 20
+
 # Создание движка базы данных с пулом соединений
 engine = create_engine(
     settings.database_url,
-    pool_size=10,                # Размер пула соединений
-    max_overflow=20,             # Максимальное переполнение
+    pool_size=DB_POOL_SIZE,      # Размер пула соединений
+    max_overflow=DB_MAX_OVERFLOW, # Максимальное переполнение
     pool_recycle=3600,           # Пересоздание соединений каждый час
     pool_pre_ping=True,          # Проверка соединений перед использованием
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
     echo=False                   # Отключаем SQL логи для производительности
 )
 
-# Создание сессии
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Создание сессии. expire_on_commit=False: объекты, возвращаемые из get_session,
+# остаются читаемыми после коммита и закрытия сессии (их кэшируют обработчики)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Создание таблиц
 try:
@@ -42,6 +48,8 @@ class DatabaseService:
     
     def __init__(self):
         self.session_factory = SessionLocal
+        # Не больше одновременных вызовов из async-кода, чем соединений в пуле
+        self._async_slots = asyncio.BoundedSemaphore(DB_POOL_SIZE + DB_MAX_OVERFLOW)
         logger.info("🗄️ [Database] Сервис базы данных инициализирован")
     
     @contextmanager
@@ -203,44 +211,49 @@ class DatabaseService:
         """ИСПРАВЛЕНО: Обновить прогресс урока И общий прогресс пользователя"""
         try:
             with self.get_session() as session:
-                progress = session.query(LessonProgress).filter(
-                    and_(
-                        LessonProgress.user_id == user_id,
-                        LessonProgress.topic_id == topic_id,
-                        LessonProgress.lesson_id == lesson_id
-                    )
-                ).first()
-                
-                if not progress:
-                    logger.warning(f"⚠️ [Database] Прогресс урока не найден: {topic_id}.{lesson_id} для {user_id}")
-                    return False
-                
-                # Запоминаем старое состояние
-                was_completed_before = progress.is_completed
-                
-                # Обновляем прогресс урока
-                progress.attempts += 1
-                progress.last_attempt_score = score
-                progress.last_attempt_at = datetime.utcnow()
-                
-                if score > progress.best_score:
-                    progress.best_score = score
-                
-                if is_completed and not progress.is_completed:
-                    progress.is_completed = True
-                    progress.completed_at = datetime.utcnow()
-                
-                # НОВОЕ: Обновляем общий прогресс пользователя если урок завершен впервые
-                if is_completed and not was_completed_before:
-                    self._update_user_total_progress(session, user_id)
-                
-                logger.info(f"📊 [Database] Обновлен прогресс урока {topic_id}.{lesson_id}: score={score}, completed={is_completed}")
-                return True
+                return self._apply_lesson_progress(session, user_id, topic_id, lesson_id, score, is_completed)
                 
         except Exception as e:
             logger.error(f"❌ [Database] Ошибка обновления прогресса урока: {e}")
             return False
     
+    def _apply_lesson_progress(self, session: Session, user_id: str, topic_id: str, lesson_id: int,
+                               score: float, is_completed: bool) -> bool:
+        """Изменение прогресса урока в рамках переданной сессии БД"""
+        progress = session.query(LessonProgress).filter(
+            and_(
+                LessonProgress.user_id == user_id,
+                LessonProgress.topic_id == topic_id,
+                LessonProgress.lesson_id == lesson_id
+            )
+        ).first()
+        
+        if not progress:
+            logger.warning(f"⚠️ [Database] Прогресс урока не найден: {topic_id}.{lesson_id} для {user_id}")
+            return False
+        
+        # Запоминаем старое состояние
+        was_completed_before = progress.is_completed
+        
+        # Обновляем прогресс урока
+        progress.attempts += 1
+        progress.last_attempt_score = score
+        progress.last_attempt_at = datetime.utcnow()
+        
+        if score > progress.best_score:
+            progress.best_score = score
+        
+        if is_completed and not progress.is_completed:
+            progress.is_completed = True
+            progress.completed_at = datetime.utcnow()
+        
+        # НОВОЕ: Обновляем общий прогресс пользователя если урок завершен впервые
+        if is_completed and not was_completed_before:
+            self._update_user_total_progress(session, user_id)
+        
+        logger.info(f"📊 [Database] Обновлен прогресс урока {topic_id}.{lesson_id}: score={score}, completed={is_completed}")
+        return True
+    
     def _update_user_total_progress(self, session: Session, user_id: str):
         """НОВЫЙ МЕТОД: Обновление общего прогресса пользователя"""
         try:
@@ -410,23 +423,61 @@ class DatabaseService:
         """Завершить сессию тестирования"""
         try:
             with self.get_session() as session:
-                quiz_session = session.query(QuizSession).filter(
-                    QuizSession.id == session_id
-                ).first()
-                
-                if quiz_session:
-                    quiz_session.is_completed = True
-                    quiz_session.score = final_score
-                    quiz_session.completed_at = datetime.utcnow()
-                    
-                    logger.info(f"✅ [Database] Завершена сессия тестирования {session_id} с результатом {final_score}%")
-                    return True
-                return False
+                return self._apply_quiz_completion(session, session_id, final_score)
                 
         except Exception as e:
             logger.error(f"❌ [Database] Ошибка завершения сессии тестирования: {e}")
             return False
     
+    def _apply_quiz_completion(self, session: Session, session_id: int, final_score: float) -> bool:
+        """Отметка сессии тестирования завершенной в рамках переданной сессии БД"""
+        quiz_session = session.query(QuizSession).filter(
+            QuizSession.id == session_id
+        ).first()
+        
+        if not quiz_session:
+            return False
+        
+        quiz_session.is_completed = True
+        quiz_session.score = final_score
+        quiz_session.completed_at = datetime.utcnow()
+        
+        logger.info(f"✅ [Database] Завершена сессия тестирования {session_id} с результатом {final_score}%")
+        return True
+    
+    def _apply_answers_append(self, session: Session, session_id: int, answers: List[Dict[str, Any]]) -> bool:
+        """UPDATE сессии тестирования с добавлением ответов в конец JSON-списка"""
+        if session.get_bind().dialect.name == "sqlite":
+            # json_insert есть только в SQLite: список дописывается на стороне БД, передаются только новые элементы.
+            # coalesce - для старых строк с answers = NULL, иначе json_insert вернет NULL
+            new_answers = func.coalesce(QuizSession.answers, text("'[]'"))
+            for answer in answers:
+                new_answers = func.json_insert(new_answers, '$[#]', func.json(json.dumps(answer, ensure_ascii=False)))
+        else:
+            current = session.query(QuizSession.answers).filter(QuizSession.id == session_id).scalar()
+            new_answers = (current or []) + answers
+        
+        updated = session.query(QuizSession).filter(
+            QuizSession.id == session_id
+        ).update({QuizSession.answers: new_answers}, synchronize_session=False)
+        logger.debug("🧪 [Database] Дописаны ответы сессии тестирования %s: %s", session_id, len(answers))
+        return updated > 0
+    
+    def finalize_quiz(self, session_id: int, user_id: str, topic_id: str, lesson_id: int,
+                      score: float, passed: bool, new_answers: List[Dict[str, Any]] = None) -> bool:
+        """Завершение теста одной транзакцией: ответы, итог сессии и прогресс урока"""
+        try:
+            with self.get_session() as session:
+                if new_answers:
+                    self._apply_answers_append(session, session_id, new_answers)
+                if not self._apply_quiz_completion(session, session_id, score):
+                    return False
+                return self._apply_lesson_progress(session, user_id, topic_id, lesson_id, score, passed)
+                
+        except Exception as e:
+            logger.error(f"❌ [Database] Ошибка завершения тестирования: {e}")
+            return False
+    
     # Методы для аналитики и отчетности
     
     def get_user_progress_summary(self, user_id: str) -> UserProgressResponse:
@@ -439,7 +490,7 @@ class DatabaseService:
                 
                 if not user:
                     logger.debug(f"👤 [Database] Пользователь {user_id} не найден, создаем пустой профиль")
-                    return UserProgressResponse(
+                    return UserProgressResponse.model_construct(
                         user_id=user_id,
                         total_lessons_completed=0,
                         total_score=0.0,
@@ -491,7 +542,8 @@ class DatabaseService:
                 
                 logger.debug(f"📊 [Database] Получена сводка прогресса для {user_id}")
                 
-                return UserProgressResponse(
+                # Данные уже типизированы ORM - пропускаем повторную валидацию и копирование словарей
+                return UserProgressResponse.model_construct(
                     user_id=user_id,
                     total_lessons_completed=user.total_lessons_completed,
                     total_score=user.total_score,
@@ -504,6 +556,11 @@ class DatabaseService:
             logger.error(f"❌ [Database] Ошибка получения сводки прогресса: {e}")
             raise
     
+    async def run_async(self, method, *args, **kwargs):
+        """Вызов синхронного метода сервиса из async-обработчика без блокировки event loop"""
+        async with self._async_slots:
+            return await asyncio.to_thread(method, *args, **kwargs)
+    
     def reset_user_progress(self, user_id: str) -> bool:
         """Сбросить весь прогресс пользователя"""
         try:
@@ -3,10 +3,10 @@
 """
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, JSON, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from enum import Enum
 
 Base = declarative_base()
@@ -73,7 +73,7 @@ class QuizSession(Base):
     
     # Данные сессии
     questions = Column(JSON, nullable=False)  # Список вопросов
-    answers = Column(JSON, default=list)     # Ответы пользователя
+    answers = Column(JSON, nullable=False, default=list, server_default=text("'[]'"))  # Ответы пользователя
     current_question = Column(Integer, default=0)
     
     # Результаты
@@ -129,6 +129,9 @@ class QuizResult(BaseModel):
 
 class UserProgressResponse(BaseModel):
     """Ответ с прогрессом пользователя"""
+    # Сводка только читается обработчиками; собирается из БД через model_construct
+    model_config = ConfigDict(frozen=True)
+    
     user_id: str
     total_lessons_completed: int
     total_score: float
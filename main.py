@@ -9,8 +9,9 @@ import traceback
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
 
-from telegram.ext import Application
+from telegram.ext import Application, AIORateLimiter
 from telegram import Update
+from telegram.request import HTTPXRequest
 from telegram.ext import ContextTypes
 
 # Добавляем корневую директорию в путь
@@ -233,8 +234,16 @@ async def main():
         # Инициализируем все системы агента
         await initialize_agent_systems()
         
-        # Создаем Telegram приложение
-        application = Application.builder().token(settings.telegram_bot_token).build()
+        # Создаем Telegram приложение с общим пулом HTTP/2 соединений
+        from config.performance_config import TELEGRAM_HTTP, TELEGRAM_RATE_LIMITS
+        application = (
+            Application.builder()
+            .token(settings.telegram_bot_token)
+            .request(HTTPXRequest(**TELEGRAM_HTTP))
+            .get_updates_request(HTTPXRequest(http_version=TELEGRAM_HTTP["http_version"]))
+            .rate_limiter(AIORateLimiter(**TELEGRAM_RATE_LIMITS))
+            .build()
+        )
         
         # Регистрируем обработчики
         register_all_handlers(application)
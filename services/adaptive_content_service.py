@@ -67,17 +67,17 @@ class AdaptiveContentService:
                 questions = self._generate_questions_with_llm(topic, lesson_id, difficulty, count)
                 if questions and len(questions) >= count:
                     logger.info(f"✅ Успешно сгенерировано {len(questions)} вопросов с LLM")
-                    return [q.dict() for q in questions]
+                    return [q.model_dump() for q in questions]
                 else:
                     logger.warning("LLM генерация не удалась, используем fallback")
 
             # Fallback к статическим вопросам
             logger.warning(f"Используется fallback-метод генерации вопросов для {user_id}")
-            return [q.dict() for q in self._get_fallback_questions(topic, lesson_id, count)]
+            return [q.model_dump() for q in self._get_fallback_questions(topic, lesson_id, count)]
 
         except Exception as e:
             logger.error(f"Критическая ошибка генерации вопросов: {e}")
-            return [q.dict() for q in self._get_fallback_questions(topic, lesson_id, 3)]
+            return [q.model_dump() for q in self._get_fallback_questions(topic, lesson_id, 3)]
 
     def _generate_questions_with_llm(self, topic: str, lesson_id: int, difficulty: str, count: int) -> Optional[List[GeneratedQuestion]]:
         """ИСПРАВЛЕНО: Улучшенная генерация с LLM"""
@@ -11,7 +11,7 @@ import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
 from core.database import db_service
-from config.bot_config import LEARNING_STRUCTURE
+from config.bot_config import LEARNING_STRUCTURE, TOPIC_LESSON_COUNTS
 
 logger = logging.getLogger(__name__)
 
@@ -137,13 +137,15 @@ class ProgressService:
     @staticmethod
     def _create_initial_progress() -> Dict[str, Any]:
         """Создает начальную структуру прогресса"""
+        # Одна отметка времени на оба поля: форматируем один раз
+        now = datetime.now().isoformat()
         return {
             "topics_progress": {},
             "total_lessons_completed": 0,
             "total_score": 0,
             "total_attempts": 0,
-            "created_at": datetime.now().isoformat(),
-            "last_activity": datetime.now().isoformat()
+            "created_at": now,
+            "last_activity": now
         }
     
     @staticmethod
@@ -180,7 +182,7 @@ class ProgressService:
             topic_progress = user_progress.get("topics_progress", {}).get(topic_id, {})
             completed_lessons = topic_progress.get("completed_lessons", 0)
             
-            total_lessons = len(LEARNING_STRUCTURE.get(topic_id, {}).get("lessons", []))
+            total_lessons = TOPIC_LESSON_COUNTS.get(topic_id, 0)
             progress_percentage = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0
             
             return {
@@ -235,7 +237,7 @@ class ProgressService:
             # Достижения за темы
             topics_progress = user_progress.get("topics_progress", {})
             for topic_id, topic_data in topics_progress.items():
-                total_lessons = len(LEARNING_STRUCTURE.get(topic_id, {}).get("lessons", []))
+                total_lessons = TOPIC_LESSON_COUNTS.get(topic_id, 0)
                 completed = topic_data.get("completed_lessons", 0)
                 if completed == total_lessons and total_lessons > 0:
                     topic_title = LEARNING_STRUCTURE[topic_id]["title"]
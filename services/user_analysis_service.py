@@ -2,23 +2,63 @@
 Сервис для глубокого анализа прогресса и профиля пользователя.
 Централизует всю аналитическую логику.
 """
+import copy
 import logging
-from typing import Dict, Any
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
 
 from core.database import db_service
 from services.progress_service import progress_service
+from config.performance_config import CACHE_SETTINGS
 
 logger = logging.getLogger(__name__)
 
+# Пороги профиля: bisect_right(пороги, значение) дает индекс уровня
+_EXPERIENCE_THRESHOLDS = (5, 10)        # завершенных уроков
+_EXPERIENCE_LEVELS = ("beginner", "intermediate", "advanced")
+_MOTIVATION_THRESHOLDS = (60, 85)       # средний балл
+_MOTIVATION_LEVELS = ("low", "medium", "high")
+_SUPPORT_THRESHOLDS = (1, 2)            # число слабых тем
+_SUPPORT_LEVELS = ("low", "medium", "high")
+
 
 class UserAnalysisService:
     """Сервис для анализа пользователя."""
 
+    def __init__(self):
+        # user_id -> (момент истечения по time.monotonic, анализ); LRU с ограничением размера
+        self._analysis_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
     def get_full_user_analysis(self, user_id: str) -> Dict[str, Any]:
         """
         Собирает полный аналитический профиль пользователя.
         Это основная точка входа для получения данных об пользователе.
+        Результат кэшируется на user_progress_cache_ttl секунд; вызывающий получает копию.
         """
+        key = str(user_id)
+        cache = self._analysis_cache
+        cached = cache.get(key)
+        if cached is not None:
+            if time.monotonic() < cached[0]:
+                cache.move_to_end(key)
+                return copy.deepcopy(cached[1])
+            del cache[key]
+
+        analysis = self._collect_user_analysis(user_id)
+        if "error" not in analysis:
+            cache[key] = (time.monotonic() + CACHE_SETTINGS["user_progress_cache_ttl"], copy.deepcopy(analysis))
+            if len(cache) > CACHE_SETTINGS["user_analysis_cache_size"]:
+                cache.popitem(last=False)
+        return analysis
+
+    def invalidate_user(self, user_id) -> None:
+        """Сбрасывает кэш анализа после изменения прогресса пользователя"""
+        self._analysis_cache.pop(str(user_id), None)
+
+    def _collect_user_analysis(self, user_id: str) -> Dict[str, Any]:
+        """Сбор анализа из прогресса и статистики (без кэша)."""
         try:
             progress_summary = db_service.get_user_progress_summary(user_id)
             detailed_stats = progress_service.get_overall_statistics(user_id)
@@ -29,7 +69,7 @@ class UserAnalysisService:
             content_settings = self._configure_content_settings(personalization_strategy)
 
             return {
-                "user_progress": progress_summary.dict(),
+                "user_progress": progress_summary.model_dump(),
                 "detailed_statistics": detailed_stats,
                 "user_profile": user_profile,
                 "learning_patterns": learning_patterns,
@@ -83,22 +123,12 @@ class UserAnalysisService:
         }
         try:
             completed_lessons = progress_summary.total_lessons_completed
-            if completed_lessons >= 10:
-                profile["experience_level"] = "advanced"
-            elif completed_lessons >= 5:
-                profile["experience_level"] = "intermediate"
-
             avg_score = detailed_stats.get("average_score", 0)
-            if avg_score >= 85:
-                profile["motivation_level"] = "high"
-            elif avg_score < 60:
-                profile["motivation_level"] = "low"
-
-            weak_topics_count = len(detailed_stats.get("weak_topics", []))
-            if weak_topics_count >= 2:
-                profile["support_needs"] = "high"
-            elif weak_topics_count == 0:
-                profile["support_needs"] = "low"
+            weak_topics_count = len(detailed_stats.get("weak_topics", ()))
+
+            profile["experience_level"] = _EXPERIENCE_LEVELS[bisect_right(_EXPERIENCE_THRESHOLDS, completed_lessons)]
+            profile["motivation_level"] = _MOTIVATION_LEVELS[bisect_right(_MOTIVATION_THRESHOLDS, avg_score)]
+            profile["support_needs"] = _SUPPORT_LEVELS[bisect_right(_SUPPORT_THRESHOLDS, weak_topics_count)]
         except Exception as e:
             logger.error(f"Ошибка построения профиля пользователя: {e}")
         return profile
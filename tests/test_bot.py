@@ -0,0 +1,260 @@
+"""
+Тесты бота: разбор callback_data, кэши, классификация профиля и завершение теста
+"""
+import itertools
+import os
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# Настройки валидируются при импорте: заглушка токена и отдельная БД во временном каталоге
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test_bot.db"))
+
+from bot.keyboards import menu_keyboards
+from bot.utils import performance_optimizer
+from bot.utils.helpers import parse_callback_data
+from config.bot_config import LEARNING_STRUCTURE, TOPIC_ALIASES
+from config.performance_config import CACHE_SETTINGS
+from core.database import db_service
+from core.models import QuizSession
+from services import user_analysis_service as user_analysis_module
+
+
+class FakeClock:
+    """Управляемая замена time.monotonic"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def _legacy_parse_callback_data(data: str) -> dict:
+    """Разбор callback_data до перехода на регулярное выражение"""
+    result = {}
+    for part in data.split(';'):
+        if ':' in part:
+            key, value = part.split(':', 1)
+            result[key] = value.strip()
+    return result
+
+
+def _legacy_profile(completed_lessons: int, avg_score: float, weak_topics_count: int) -> dict:
+    """Классификация профиля цепочкой if/elif до перехода на bisect"""
+    profile = {"experience_level": "beginner", "motivation_level": "medium", "support_needs": "medium"}
+    if completed_lessons >= 10:
+        profile["experience_level"] = "advanced"
+    elif completed_lessons >= 5:
+        profile["experience_level"] = "intermediate"
+    if avg_score >= 85:
+        profile["motivation_level"] = "high"
+    elif avg_score < 60:
+        profile["motivation_level"] = "low"
+    if weak_topics_count >= 2:
+        profile["support_needs"] = "high"
+    elif weak_topics_count == 0:
+        profile["support_needs"] = "low"
+    return profile
+
+
+# --- parse_callback_data ---
+
+@pytest.mark.parametrize("data, expected", [
+    ("action:topic;tid:r_basics;lesson_id:1", {"action": "topic", "tid": "r_basics", "lesson_id": "1"}),
+    ("action:back_to_menu", {"action": "back_to_menu"}),
+    ("action:ask;q:a:b", {"action": "ask", "q": "a:b"}),
+    ("action:menu;garbage", {"action": "menu"}),
+    ("action:", {"action": ""}),
+    ("", {}),
+    (None, {}),
+])
+def test_parse_callback_data(data, expected):
+    assert parse_callback_data(data) == expected
+
+
+def test_parse_callback_data_matches_legacy_parser():
+    samples = [menu_keyboards.create_callback_data("back_to_topics")]
+    for alias in TOPIC_ALIASES.values():
+        samples.append(menu_keyboards.create_callback_data("topic", tid=alias))
+        samples.append(menu_keyboards.create_callback_data("lesson", tid=alias, lesson_id=3))
+    for data in samples:
+        assert parse_callback_data(data) == _legacy_parse_callback_data(data)
+
+
+# --- Классификация профиля ---
+
+def test_profile_thresholds_match_legacy_if_chain():
+    service = user_analysis_module.UserAnalysisService()
+    for completed, avg_score, weak in itertools.product(
+        (0, 4, 5, 9, 10, 25), (0, 59.9, 60, 84.9, 85, 100), (0, 1, 2, 5)
+    ):
+        profile = service._build_user_profile(
+            SimpleNamespace(total_lessons_completed=completed),
+            {"average_score": avg_score, "weak_topics": ["topic"] * weak}
+        )
+        assert profile == _legacy_profile(completed, avg_score, weak), (completed, avg_score, weak)
+
+
+# --- Кэш PerformanceOptimizer ---
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(performance_optimizer, "time", fake)
+    monkeypatch.setattr(user_analysis_module, "time", fake)
+    return fake
+
+
+def test_optimizer_entry_expires(clock):
+    optimizer = performance_optimizer.PerformanceOptimizer()
+    optimizer.add_to_cache("key", "value", ttl=10)
+    assert optimizer.get_from_cache("key") == "value"
+
+    clock.now += 11
+    assert optimizer.get_from_cache("key") is None
+    assert "key" not in optimizer.cache
+
+
+def test_optimizer_evicts_by_expiry_with_mixed_ttls(clock):
+    optimizer = performance_optimizer.PerformanceOptimizer()
+    optimizer.add_to_cache("long", 1, ttl=100)
+    optimizer.add_to_cache("short", 2, ttl=1)
+
+    clock.now += 2
+    optimizer.add_to_cache("new", 3, ttl=10)
+
+    assert "short" not in optimizer.cache
+    assert optimizer.get_from_cache("long") == 1
+    assert optimizer.get_from_cache("new") == 3
+
+
+def test_optimizer_keeps_rewritten_entry(clock):
+    optimizer = performance_optimizer.PerformanceOptimizer()
+    optimizer.add_to_cache("key", "old", ttl=1)
+    optimizer.add_to_cache("key", "new", ttl=100)
+
+    clock.now += 2
+    optimizer.add_to_cache("other", 1, ttl=10)
+
+    assert optimizer.get_from_cache("key") == "new"
+
+
+# --- Кэш UserAnalysisService ---
+
+@pytest.fixture
+def analysis_service(monkeypatch):
+    service = user_analysis_module.UserAnalysisService()
+    service.collect_calls = []
+
+    def collect(user_id):
+        service.collect_calls.append(user_id)
+        return {"user_progress": {"user_id": user_id, "calls": len(service.collect_calls)}}
+
+    monkeypatch.setattr(service, "_collect_user_analysis", collect)
+    return service
+
+
+def test_analysis_cache_returns_copies(clock, analysis_service):
+    first = analysis_service.get_full_user_analysis("1")
+    first["user_progress"]["calls"] = 999
+
+    second = analysis_service.get_full_user_analysis("1")
+    assert second["user_progress"]["calls"] == 1
+    assert analysis_service.collect_calls == ["1"]
+
+
+def test_analysis_cache_expires(clock, analysis_service):
+    analysis_service.get_full_user_analysis("1")
+    clock.now += CACHE_SETTINGS["user_progress_cache_ttl"] + 1
+
+    assert analysis_service.get_full_user_analysis("1")["user_progress"]["calls"] == 2
+
+
+def test_analysis_cache_evicts_least_recently_used(clock, analysis_service, monkeypatch):
+    monkeypatch.setitem(CACHE_SETTINGS, "user_analysis_cache_size", 2)
+    for user_id in ("1", "2", "1", "3"):
+        analysis_service.get_full_user_analysis(user_id)
+
+    assert list(analysis_service._analysis_cache) == ["1", "3"]
+
+
+def test_analysis_cache_skips_errors_and_invalidates(clock, analysis_service, monkeypatch):
+    monkeypatch.setattr(analysis_service, "_collect_user_analysis", lambda user_id: {"error": "db"})
+    analysis_service.get_full_user_analysis("1")
+    assert "1" not in analysis_service._analysis_cache
+
+    monkeypatch.undo()
+    analysis_service.get_full_user_analysis("2")
+    analysis_service.invalidate_user(2)
+    assert "2" not in analysis_service._analysis_cache
+
+
+# --- Подписи клавиатур ---
+
+def _progress(topic_id: str, lessons: dict, completed: int = 0) -> dict:
+    return {"topics_progress": {topic_id: {"completed_lessons": completed, "lessons": lessons}}}
+
+
+def test_lessons_keyboard_reused_for_same_signature():
+    topic_id = next(iter(LEARNING_STRUCTURE))
+    first = menu_keyboards.get_lessons_keyboard(topic_id, _progress(topic_id, {1: {"is_completed": True, "attempts": 1}}))
+    # Поля вне подписи (например, балл) не влияют на клавиатуру
+    same = menu_keyboards.get_lessons_keyboard(
+        topic_id, _progress(topic_id, {1: {"is_completed": True, "attempts": 3, "best_score": 90}})
+    )
+    changed = menu_keyboards.get_lessons_keyboard(topic_id, _progress(topic_id, {1: {"is_completed": False, "attempts": 1}}))
+
+    assert same is first
+    assert changed is not first
+    assert changed != first
+
+
+def test_topics_keyboard_signature_tracks_completed_lessons():
+    topic_id = next(iter(LEARNING_STRUCTURE))
+    assert menu_keyboards.get_topics_keyboard() is menu_keyboards.get_topics_keyboard({})
+    assert menu_keyboards._topics_signature(_progress(topic_id, {}, completed=1)) == ((topic_id, 1),)
+    assert (menu_keyboards.get_topics_keyboard(_progress(topic_id, {}, completed=1))
+            is menu_keyboards.get_topics_keyboard(_progress(topic_id, {}, completed=1)))
+
+
+# --- Разбор callback тестирования ---
+
+def test_quiz_callback_from_match():
+    quiz_handler = pytest.importorskip("bot.handlers.quiz_handler")
+    topic_id, alias = next(iter(TOPIC_ALIASES.items()))
+
+    match = quiz_handler._QUIZ_CALLBACK_PATTERN.match(f"action:retry;tid:{alias};lesson_id:2")
+    assert quiz_handler.QuizCallback.from_match(match) == quiz_handler.QuizCallback("retry", topic_id, 2, -1)
+
+    match = quiz_handler._QUIZ_CALLBACK_PATTERN.match("action:answer;index:3")
+    assert quiz_handler.QuizCallback.from_match(match) == quiz_handler.QuizCallback("answer", None, None, 3)
+
+    assert quiz_handler._QUIZ_CALLBACK_PATTERN.match("action:answer;index:x") is None
+
+
+# --- Завершение теста ---
+
+def test_finalize_quiz_appends_answers_and_records_progress():
+    user_id, topic_id, lesson_id = "finalize-test", next(iter(LEARNING_STRUCTURE)), 1
+    db_service.get_or_create_lesson_progress(user_id, topic_id, lesson_id)
+    quiz = db_service.create_quiz_session(user_id, topic_id, lesson_id, [{"question": "q1"}, {"question": "q2"}])
+    answers = [
+        {"question_index": 0, "user_answer": 1, "is_correct": True},
+        {"question_index": 1, "user_answer": 0, "is_correct": False},
+    ]
+
+    assert db_service.finalize_quiz(quiz.id, user_id, topic_id, lesson_id, 50.0, False, answers)
+
+    with db_service.get_session() as session:
+        stored = session.get(QuizSession, quiz.id)
+        assert stored.answers == answers
+        assert stored.is_completed
+        assert stored.score == 50.0
+
+    progress = db_service.get_lesson_progress(user_id, topic_id, lesson_id)
+    assert progress.attempts == 1
+    assert progress.last_attempt_score == 50.0
+    assert not progress.is_completed